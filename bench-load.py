@@ -0,0 +1,270 @@
+#! /usr/bin/env python3
+#
+# Load test convert, compare and alignment over a (synthetic) volume.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Each stage is run by a pool of worker processes, once for each worker
+# count asked for, and timed from the first task handed out to the last
+# result. A stage works as the tools do: convert parses the volume once per
+# task for the books of the task, as convert-swete.py -c does, while compare
+# (the difflib.Differ diff of swete-correct.py) and alignment (swete-align.py)
+# take a book per task, against a CATSS-like witness made by roughening the
+# Swete compare stream of the book. Memory is the peak resident set of any
+# worker, as the worker reports it. Workers are spawned rather than forked,
+# so that the peak does not take in what a fork would inherit from the
+# harness, and the clock starts once all of them are up.
+
+import argparse
+import difflib
+import importlib
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import unicodedata
+import xml.sax
+
+import corpus
+
+swete = importlib.import_module("convert-swete")
+align = importlib.import_module("swete-align")
+
+STAGES = ["convert", "compare", "align"]
+SEED = 1901
+# Share of the lines of a witness that lose their accents, and that are
+# dropped, verse numbers included
+UNACCENTED = 0.1
+DROPPED = 0.01
+
+
+class LineCounter:
+    "A stream that counts the lines written to it and keeps nothing"
+
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count("\n")
+
+    def flush(self):
+        pass
+
+
+class BookSplitter(swete.SweteLXX):
+    "SweteLXX in compare mode, writing each book to a file of its own"
+
+    def __init__(self, directory, volume):
+        swete.SweteLXX.__init__(self, book=None, task="compare",
+                                volume=volume)
+        self.directory = directory
+        self.books = []
+
+    def startElement(self, name, attrs):
+        "Start a new file at each book"
+
+        if (name == "div" and "subtype" in attrs.getNames()
+           and attrs.getValue("subtype") == "chapter"):
+            self.close_book()
+            path = os.path.join(self.directory,
+                                "%s-swete.txt" % attrs.getValue("n"))
+            self.out = open(path, 'w', encoding='utf-8')
+            self.books.append(path)
+        swete.SweteLXX.startElement(self, name, attrs)
+
+    def close_book(self):
+        "Close the file of the book before"
+
+        if self.out is not sys.stdout:
+            self.out.close()
+            self.out = sys.stdout
+
+    def endDocument(self):
+        self.close_book()
+
+
+def strip_accents(token):
+    "Return the token without combining marks, as CATSS often has it"
+
+    return "".join(char for char in unicodedata.normalize("NFD", token)
+                   if not unicodedata.combining(char))
+
+
+def write_witness(path, witness, rng):
+    "Write a roughened copy of a compare stream, standing in for CATSS"
+
+    with open(path, 'r', encoding='utf-8') as stream, \
+            open(witness, 'w', encoding='utf-8') as out:
+        for line in stream:
+            if rng.random() < DROPPED:
+                continue
+            if rng.random() < UNACCENTED:
+                line = strip_accents(line)
+            out.write(line)
+
+
+def prepare(path, volume, directory):
+    """Write the compare stream of each book of the volume and a witness of
+    it, and return the (stream, witness) paths."""
+
+    splitter = BookSplitter(directory, volume)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(splitter)
+    with corpus.open_text(path) as vol:
+        parser.parse(vol)
+    rng = random.Random(SEED)
+    books = []
+    for stream in splitter.books:
+        witness = stream.replace("-swete.txt", "-catss.txt")
+        write_witness(stream, witness, rng)
+        books.append((stream, witness))
+    return books
+
+
+def peak_rss():
+    "Return the peak resident set of this process in MB"
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux counts kilobytes, macOS bytes
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def ready(started):
+    "Wait in a new worker until the whole pool is up"
+
+    started.wait()
+
+
+def run_convert(task):
+    "Convert the books of a task, parsing the whole volume"
+
+    path, volume, books = task
+    out = LineCounter()
+    handler = swete.SweteLXX(book=",".join(books), task="convert",
+                             volume=volume, out=out)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    with corpus.open_text(path) as vol:
+        parser.parse(vol)
+    return out.lines, peak_rss()
+
+
+def run_compare(task):
+    "Diff the compare stream of a book against its witness"
+
+    stream, witness = task
+    with open(stream, 'r', encoding='utf-8') as source:
+        source_lines = source.readlines()
+    with open(witness, 'r', encoding='utf-8') as delta:
+        delta_lines = delta.readlines()
+    for line in difflib.Differ().compare(source_lines, delta_lines):
+        pass
+    # Tokens are counted as the alignment counts them, without verse numbers
+    tokens = sum(1 for line in source_lines
+                 if line.strip() and not align.VERSE_PAT.match(line.strip()))
+    return tokens, peak_rss()
+
+
+def run_align(task):
+    "Align a book with its witness"
+
+    stream, witness = task
+    witnesses = align.read_witnesses([stream, witness])
+    tokens = sum(len(tokens) for tokens in witnesses[0].values())
+    for key, column in align.align(witnesses):
+        align.vote(column)
+    return tokens, peak_rss()
+
+
+def tasks(stage, path, volume, books, workers):
+    "Return the tasks of a stage"
+
+    if stage == "convert":
+        numbers = [os.path.basename(stream).split("-")[0]
+                   for stream, witness in books]
+        # One parse of the volume per worker, as many books each
+        return [(path, volume, numbers[num::workers])
+                for num in range(workers) if numbers[num::workers]]
+    return books
+
+
+def run_stage(stage, path, volume, books, workers):
+    "Return (tokens, seconds, peak worker MB) of a stage"
+
+    function = {"convert": run_convert, "compare": run_compare,
+                "align": run_align}[stage]
+    work = tasks(stage, path, volume, books, workers)
+    context = multiprocessing.get_context("spawn")
+    started = context.Barrier(workers + 1)
+    with context.Pool(workers, initializer=ready,
+                      initargs=(started,)) as pool:
+        started.wait()
+        start = time.perf_counter()
+        results = list(pool.imap_unordered(function, work))
+        elapsed = time.perf_counter() - start
+    return (sum(tokens for tokens, peak in results), elapsed,
+            max(peak for tokens, peak in results))
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Measure throughput, memory and scaling with workers '
+        'of convert, compare and alignment.')
+    argparser.add_argument('path', metavar='<file>', type=str,
+                           help='Volume, e.g. from swete-synth.py')
+    argparser.add_argument('--volume', '-v', metavar='<num>', type=int,
+                           default=3, help='Volume whose book numbering '
+                           'to use')
+    argparser.add_argument('--workers', '-w', metavar='<num>', type=int,
+                           nargs='+', default=[1, 2, 4],
+                           help='Worker counts to run each stage with')
+    argparser.add_argument('--stages', '-s', metavar='<stage>', nargs='+',
+                           choices=STAGES, default=STAGES,
+                           help='Stages to run (default: all)')
+
+    args = argparser.parse_args()
+    directory = tempfile.mkdtemp(prefix="bench-load-")
+    try:
+        start = time.perf_counter()
+        books = prepare(args.path, args.volume, directory)
+        print("Prepared %d books in %.1f s" % (
+            len(books), time.perf_counter() - start))
+        print("%-8s %7s %9s %9s %11s %8s %9s" % (
+            "stage", "workers", "tokens", "seconds", "tokens/s", "speedup",
+            "peak MB"))
+        for stage in args.stages:
+            base = None
+            for workers in args.workers:
+                tokens, seconds, peak = run_stage(stage, args.path,
+                                                  args.volume, books, workers)
+                rate = tokens / seconds
+                base = base or rate
+                print("%-8s %7d %9d %9.2f %11.0f %7.2fx %9.1f" % (
+                    stage, workers, tokens, seconds, rate, rate / base, peak))
+    finally:
+        shutil.rmtree(directory)
+    print("Peak MB of the harness: %.1f" % peak_rss())
@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+#
+# Measure the Unicode normalization work of converting a whole volume.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import importlib
+import os
+import statistics
+import time
+import unicodedata
+import xml.sax
+
+import corpus
+import koine
+
+swete = importlib.import_module("convert-swete")
+
+# Passes over the tokens timed, of which the median is reported
+PASSES = 5
+
+
+class RecordingLXX(swete.SweteLXX):
+    "SweteLXX that records every token it normalizes"
+
+    def __init__(self, *args, **kwargs):
+        swete.SweteLXX.__init__(self, *args, **kwargs)
+        self.normalized = []
+
+    def unicode_normalize(self, text):
+        self.normalized.append(text)
+        return swete.SweteLXX.unicode_normalize(self, text)
+
+
+def volume_tokens(volume, task):
+    "Return the tokens normalized while running task over a whole volume"
+
+    handler = RecordingLXX(book=None, task=task, volume=volume,
+                           out=open(os.devnull, 'w'))
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    with corpus.open_text(swete.volume_path(volume)) as vol:
+        parser.parse(vol)
+    return handler.normalized
+
+
+def timed(function, tokens, passes=PASSES, setup=None):
+    """Return the median seconds taken to apply function to each token,
+    calling setup before each pass"""
+
+    times = []
+    for num in range(passes):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for token in tokens:
+            function(token)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Compare plain and cached Unicode normalization '
+        'over a volume.')
+    argparser.add_argument('--volume', '-v', metavar='<num>', type=int,
+                           default=1, help='Volume to process.')
+    argparser.add_argument('--task', '-t', type=str, default="convert",
+                           choices=["convert", "compare"],
+                           help='Task whose tokens are normalized')
+
+    args = argparser.parse_args()
+    tokens = volume_tokens(args.volume, args.task)
+    distinct = len(set(tokens))
+    changed = sum(1 for token in set(tokens)
+                  if not unicodedata.is_normalized(koine.NFKC, token))
+
+    def plain(token):
+        return unicodedata.normalize(koine.NFKC, token)
+
+    def cached(token):
+        return koine.unicode_normalize(token, koine.NFKC)
+
+    # A pass over a cold cache is what a single conversion pays; a warm
+    # one is a second conversion in the same process
+    baseline = timed(plain, tokens)
+    cold = timed(cached, tokens, setup=koine.unicode_normalize.cache_clear)
+    warm = timed(cached, tokens)
+
+    print("Tokens normalized:         %d" % len(tokens))
+    print("Distinct tokens:           %d" % distinct)
+    print("Distinct tokens not NFKC:  %d (%.1f%%)"
+          % (changed, 100.0 * changed / distinct))
+    print("Normalizations avoided:    %d (%.1f%%)"
+          % (len(tokens) - distinct,
+             100.0 * (len(tokens) - distinct) / len(tokens)))
+    for label, seconds in (("unicodedata.normalize", baseline),
+                           ("koine, cold cache", cold),
+                           ("koine, warm cache", warm)):
+        print("%-26s %.3f s (%.2f us/token)"
+              % (label + ":", seconds, seconds * 1e6 / len(tokens)))
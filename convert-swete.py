@@ -24,10 +24,12 @@
 
 import argparse
 import koinenlp
+import os
 import re
-import unicodedata
+import sys
 import xml.sax
 
+import corpus
 import koine
 
 FILTER_CHARS = ["¶", "[", "]"]
@@ -40,11 +42,161 @@ OFFSET = {1: 0,
           2: 12,
           3: 27}
 
+# Divs which are not books but go with the one before, e.g. the table of
+# the chapters of Jeremiah after it
+NOT_BOOKS = {3: (15,)}
+
+
+def book_number(volume, chapter):
+    """Return the number of a book across the volumes, as in references,
+    from its volume and chapter (div) number."""
+
+    skipped = [div for div in NOT_BOOKS.get(volume, ()) if div <= int(chapter)]
+    return int(chapter) + OFFSET[volume] - len(skipped)
+
+
+def volume_path(volume):
+    """Return the path of a volume, which may be compressed, e.g.
+    old_testament_1901_vol1.xml.gz."""
+
+    return corpus.find_file(VOLUMES[volume])
+
+
+# Versions printed on facing pages (Daniel), keyed by page_right
+PARALLEL_SIDES = ((True, "OldGreek"),
+                  (False, "Theodotion"))
+
+# On facing pages, a number further than this past the verse is taken for
+# a manuscript (87, Codex Chisianus) rather than a verse
+PARALLEL_STEP = 10
+
+ROMAN_PAT = re.compile(r'^[IVX]+$')
+ROMAN_VALUES = {"I": 1, "V": 5, "X": 10}
+# Greek capitals set for roman numerals, e.g. ΧΙ
+ROMAN_LOOKALIKES = str.maketrans("ΙΧ", "IX")
+
+
+def roman_value(numeral):
+    "Return the value of a roman numeral"
+
+    value = 0
+    for num, char in enumerate(numeral):
+        digit = ROMAN_VALUES[char]
+        if numeral[num + 1:] and ROMAN_VALUES[numeral[num + 1]] > digit:
+            value -= digit
+        else:
+            value += digit
+    return value
+
+
+def chapter_numeral(text):
+    """Return the chapter started by a marginal note, or None.
+
+    A chapter is marked by a roman numeral, as in "II" or "1 VI (2)", or by
+    verse 1 beside a bracketed numeral, as in "(2) (VI) 1". Numbers in
+    brackets give the other numbering, so "31 (VI) (1)" starts none."""
+
+    words = text.translate(ROMAN_LOOKALIKES).split()
+    plain = [word for word in words if not word.startswith("(")]
+    numerals = [word.strip("()") for word in words
+                if ROMAN_PAT.match(word.strip("()"))]
+    if len(numerals) != 1:
+        return None
+    if any(word.isdigit() and word != "1" for word in plain):
+        return None
+    if numerals[0] not in plain and "1" not in plain:
+        return None
+    return roman_value(numerals[0])
+
+
+class ByteOffsets:
+    "Map parser line and column positions to byte offsets in a volume"
+
+    def __init__(self, data):
+        "Find the start of each line in the raw volume data"
+
+        self.data = data
+        self.lines = [0]
+        pos = data.find(b"\n")
+        while pos != -1:
+            self.lines.append(pos + 1)
+            pos = data.find(b"\n", pos + 1)
+
+    def offset(self, line, column):
+        "Return the byte offset of a (1-based) line and character column"
+
+        start = self.lines[line - 1]
+        # UTF-8 takes at most four bytes per character
+        text = self.data[start:start + column * 4].decode("UTF-8", "ignore")
+        return start + len(text[:column].encode("UTF-8"))
+
+
+def page_map_path(path):
+    "Return the path of the page map kept next to a volume"
+
+    return os.path.splitext(corpus.strip_compression(path))[0] + ".pages"
+
+
+def write_page_map(path, pages):
+    """Write the page map, one tab-separated line per pb.
+
+    The columns are the page number, the byte offset of the pb tag, the side
+    of the page (R, L or - for roman numerals), the first and last reference
+    printed on the page, the reference in effect at the pb and the path of
+    open elements at the pb."""
+
+    with open(path, 'w') as out:
+        for page in pages:
+            out.write("\t".join(str(field) for field in page) + "\n")
+
+
+def read_page_map(path):
+    "Return the rows of a page map, with offsets as integers"
+
+    pages = []
+    with open(path, 'r') as page_map:
+        for line in page_map:
+            page = line.rstrip("\n").split("\t")
+            page[1] = int(page[1])
+            pages.append(page)
+    return pages
+
+
+def notes_path(path):
+    "Return the path of the notes kept next to a volume"
+
+    return os.path.splitext(corpus.strip_compression(path))[0] + ".notes"
+
+
+def write_notes_index(path, index):
+    """Write the index of a notes file, sorted by reference.
+
+    Each line gives the first and last reference of a run of notes, the
+    byte offset of the run in the notes file and the number of notes in
+    it."""
+
+    with open(path + ".idx", 'w') as out:
+        for first, last, offset, count in sorted(
+                index, key=lambda row: row[:2]):
+            out.write("%s\t%s\t%d\t%d\n" % (first, last, offset, count))
+
+
+def read_notes_index(path):
+    "Return the rows of a notes index, with numbers as integers"
+
+    index = []
+    with open(path + ".idx", 'r') as notes_index:
+        for line in notes_index:
+            first, last, offset, count = line.rstrip("\n").split("\t")
+            index.append((first, last, int(offset), int(count)))
+    return index
+
 
 class SweteLXX(xml.sax.handler.ContentHandler):
     "Parser for Swete LXX XML"
 
-    def __init__(self, book, task, volume):
+    def __init__(self, book, task, volume, out=None, split=None,
+                 offsets=None, notes=None, positions=None):
         "Initialize varibales"
 
         self.in_book = False
@@ -53,15 +205,44 @@ class SweteLXX(xml.sax.handler.ContentHandler):
         self.note_depth = 0
         self.page_right = False
         self.current_page = 0
+        self.page_name = "-"
+        # First reference of text on the page, for the footnotes on it
+        self.page_first_ref = None
 
         self.target_book = book
+        # A text may run across several divs, e.g. Daniel in volume 3
+        self.target_books = book.split(",") if book else []
         self.task = task
         self.volume = volume
-        # Set the cumulative offset of books from one in subsequent volumes
-        self.book_offset = OFFSET[self.volume]
+        self.out = out or sys.stdout
+        # In parallel mode, file prefix for separate streams of each side
+        self.split = split
+        # With the byte offsets of the volume, record a page map
+        self.offsets = offsets
+        self.pages = []
+        self.locator = None
+        self.stack = []
+        # With a stream for them, notes are written as they end, one per
+        # line, and indexed by the references they cover
+        self.notes = notes
+        self.notes_offset = 0
+        self.notes_index = []
+        self.note_type = None
+        self.note_text = []
+        # With a list for them, and the byte offsets of the volume, record
+        # the reference and byte range of each token emitted
+        self.positions = positions
+
+        # Tokens of each side of facing pages by verse, for parallel mode
+        self.parallel = {}
+        for side, label in PARALLEL_SIDES:
+            self.parallel[side] = {}
+        # Side, reference and first token of the verse last begun there
+        self.verse_start = None
 
         # Regex patterns
         self.verse_pat = re.compile(r'\d{1,3}')
+        self.token_pat = re.compile(r'\S+')
 
         # Set up the reference
         self.reset_ref()
@@ -72,53 +253,181 @@ class SweteLXX(xml.sax.handler.ContentHandler):
         self.current_book = ""
         self.current_chapter = 1
         self.current_verse = "001"
+        # Highest verse of the chapter, on facing pages
+        self.verse_top = 1
+        # Facing pages each keep their own reference
+        self.sides = {}
+        for side, label in PARALLEL_SIDES:
+            self.sides[side] = (1, "001", 1)
+
+    def current_ref(self):
+        "Return the current reference as printed in converted text"
+
+        return "%s%03d%s" % (self.current_book, self.current_chapter,
+                             self.current_verse)
+
+    def emit(self, line):
+        "Write a line of output"
+
+        print(line, file=self.out)
+
+    def turn_page(self, page_right):
+        "Switch to the reference of the other side on facing pages"
+
+        self.sides[self.page_right] = (self.current_chapter,
+                                       self.current_verse, self.verse_top)
+        (self.current_chapter, self.current_verse,
+         self.verse_top) = self.sides[page_right]
 
     def set_verse(self, verse):
         "Set the current_verse (and sometimes chapter) on transitions"
 
+        if self.task == "parallel":
+            # Chapters of facing pages come from the margin, and a verse
+            # number can be misread, so keep the chapter
+            if verse > self.verse_top + PARALLEL_STEP:
+                return
+            self.verse_top = max(self.verse_top, verse)
+            self.current_verse = "%03d" % verse
+            verses = self.parallel[self.page_right]
+            self.verse_start = (self.page_right, self.current_ref(),
+                                len(verses.get(self.current_ref(), [])))
+            return
         # Increment the chapter if the verse goes lower
         if verse < int(self.current_verse):
             self.current_chapter += 1
         self.current_verse = "%03d" % verse
         # Only print verse boundaries in compare mode
         if self.task == "compare":
-            print(self.current_verse)
+            self.emit(self.current_verse)
+
+    def start_chapter(self, chapter):
+        """Start a chapter of facing pages at its numeral in the margin.
+
+        On Old Greek pages the numeral comes after the first words of the
+        chapter, which are moved from the verse 1 they went to."""
+
+        if chapter == self.current_chapter:
+            return
+        verses = self.parallel[self.page_right]
+        moved = []
+        if (self.current_verse == "001" and self.verse_start
+           and self.verse_start[:2] == (self.page_right, self.current_ref())
+           and self.current_ref() in verses):
+            tokens = verses[self.current_ref()]
+            moved = tokens[self.verse_start[2]:]
+            del tokens[self.verse_start[2]:]
+            if not tokens:
+                del verses[self.current_ref()]
+        self.current_chapter = chapter
+        self.current_verse = "001"
+        self.verse_top = 1
+        self.verse_start = (self.page_right, self.current_ref(),
+                            len(verses.get(self.current_ref(), [])))
+        if moved:
+            verses.setdefault(self.current_ref(), []).extend(moved)
 
     def unicode_normalize(self, text):
-        """Return the given text normalized to Unicode NFC."""
+        """Return the given text normalized to Unicode NFKC."""
+
+        return koine.unicode_normalize(text, koine.NFKC)
+
+    def add_page(self, page):
+        "Record a page break in the page map"
+
+        offset = self.offsets.offset(self.locator.getLineNumber(),
+                                     self.locator.getColumnNumber())
+        if not page.isdigit():
+            side = "-"
+        elif int(page) % 2:
+            side = "L"
+        else:
+            side = "R"
+        start = self.current_ref() if self.in_book else "-"
+        self.pages.append([page, offset, side, "-", "-", start,
+                           "/".join(self.stack)])
+
+    def write_note(self):
+        """Write the note just ended, with the references it covers, its page
+        and type.
+
+        A footnote covers the text of its page, from the first reference on
+        the page to the one in effect at the end of the note; other notes
+        cover only the reference they are in."""
+
+        # Notes outside the books asked for are not wanted
+        if self.target_books and not self.in_book:
+            return
+        last = self.current_ref() if self.in_book else "-"
+        first = last
+        if self.note_type == "footnote" and self.page_first_ref:
+            first = self.page_first_ref
+        text = " ".join("".join(self.note_text).split())
+        line = "%s\t%s\t%s\t%s\t%s\n" % (first, last, self.page_name,
+                                         self.note_type,
+                                         self.unicode_normalize(text))
+        self.notes.write(line)
+        if last != "-":
+            if self.notes_index and self.notes_index[-1][:2] == [first, last]:
+                self.notes_index[-1][3] += 1
+            else:
+                self.notes_index.append([first, last, self.notes_offset, 1])
+        self.notes_offset += len(line.encode("UTF-8"))
 
-        normalized_text = unicodedata.normalize('NFKC', text)
-        return normalized_text
+    def setDocumentLocator(self, locator):
+        "Keep the locator for recording positions in the volume"
+
+        self.locator = locator
 
     def startElement(self, name, attrs):
         "Actions for encountering open tags"
 
+        if name == "pb" and self.offsets:
+            self.add_page(attrs.getValue("n"))
+        if name == "pb":
+            self.page_name = attrs.getValue("n")
+            self.page_first_ref = None
+        self.stack.append(name)
+
         if (name == "div" and "subtype" in attrs.getNames()
            and attrs.getValue("subtype") == "chapter"):
             # A "chapter" in TEI is a "book" for our purposes
             # Only count book that we want
-            if (attrs.getValue("n")) == self.target_book:
+            # Without a book, count them all
+            if (not self.target_books
+               or attrs.getValue("n") in self.target_books):
                 self.in_book = True
+            # Facing-page versions carry on from the previous div
+            if (self.in_book and self.task == "parallel"
+               and any(self.parallel.values())):
+                return
             # Reset reference info
             self.reset_ref()
-            self.current_book = "%02d" % (int(attrs.getValue("n"))
-                                          + self.book_offset)
+            self.current_book = "%02d" % book_number(self.volume,
+                                                     attrs.getValue("n"))
 
         elif name == "head":
             self.in_header = True
 
         elif name == "note":
+            if not self.in_note and "type" in attrs.getNames():
+                self.note_type = attrs.getValue("type")
+            elif not self.in_note:
+                self.note_type = "-"
             self.note_depth += 1
             self.in_note = True
 
         elif name == "pb" and self.in_book:
             self.current_page = int(attrs.getValue("n"))
-            if not self.current_page % 2:
-                self.page_right = True
-            else:
-                self.page_right = False
-
-        elif name == "lb" and self.in_book and self.page_right:
+            page_right = not self.current_page % 2
+            if self.task == "parallel" and page_right != self.page_right:
+                self.turn_page(page_right)
+            self.page_right = page_right
+
+        elif (name == "lb" and self.in_book and self.page_right
+              and self.task != "parallel"):
+            # On facing pages an lb can follow the text of its line, or give
+            # a manuscript rather than a verse, so it is not used there.
             # When on the right hand side, if the lb is higher than the verse
             # number, there must be a verse break which doesn't appear in
             # tokens, therefore increment the verse
@@ -135,10 +444,14 @@ class SweteLXX(xml.sax.handler.ContentHandler):
         # Print the book head tags (titles)
         # if self.in_header:
         #      print(data.encode("UTF-8"))
+        if self.in_note and (self.notes or self.task == "parallel"):
+            self.note_text.append(data)
         # If not in a header, and not in a note
         if self.in_book and not self.in_note and not self.in_header:
-            tokens = data.split()
-            for token in tokens:
+            data_offset = None
+            for match in self.token_pat.finditer(data):
+                token = match.group(0)
+                start = match.start()
                 # Look for verses
                 has_verse = self.verse_pat.match(token)
                 if has_verse:
@@ -146,12 +459,19 @@ class SweteLXX(xml.sax.handler.ContentHandler):
                     self.set_verse(int(new_verse))
                     # Reform the token without the verse prefix
                     token = token[len(new_verse):]
+                    start += len(new_verse)
                 # Assuming a verse ended up in its own token, no need
                 # to print an empty line
                 for char in FILTER_CHARS:
                     token.replace(char, "")
                 if len(token) < 1:
                     continue
+                if self.page_first_ref is None:
+                    self.page_first_ref = self.current_ref()
+                if self.offsets and self.pages:
+                    if self.pages[-1][3] == "-":
+                        self.pages[-1][3] = self.current_ref()
+                    self.pages[-1][4] = self.current_ref()
                 # Last character punctuation? split to new token?
                 # shim for GREEK ANO TELEIA
                 token = token.replace("·", "·")
@@ -161,20 +481,35 @@ class SweteLXX(xml.sax.handler.ContentHandler):
                     end_token = token[:-1]
                 else:
                     end_token = token
+                if self.positions is not None and end_token:
+                    if data_offset is None:
+                        data_offset = self.offsets.offset(
+                            self.locator.getLineNumber(),
+                            self.locator.getColumnNumber())
+                    begin = data_offset + len(data[:start].encode("UTF-8"))
+                    self.positions.append(
+                        (self.current_ref(), begin,
+                         begin + len(end_token.encode("UTF-8"))))
                 # Print only the normalized form
                 if self.task == "compare":
-                    print(self.unicode_normalize(end_token))
+                    self.emit(self.unicode_normalize(end_token))
                     if punct_token:
-                        print(punct_token)
+                        self.emit(punct_token)
                 elif self.task == "convert":
-                    print("%s%03d%s %s" % (self.current_book,
-                                           self.current_chapter,
-                                           self.current_verse,
-                                           self.unicode_normalize(token)))
+                    self.emit("%s%03d%s %s" % (self.current_book,
+                                               self.current_chapter,
+                                               self.current_verse,
+                                               self.unicode_normalize(token)))
+                elif self.task == "parallel":
+                    verses = self.parallel[self.page_right]
+                    verses.setdefault(self.current_ref(), []).append(
+                        self.unicode_normalize(token))
 
     def endElement(self, name):
         "Actions for encountering closed tags"
 
+        self.stack.pop()
+
         if (name == "div" and self.in_book):
             self.in_book = False
             # print("Close book")
@@ -186,6 +521,59 @@ class SweteLXX(xml.sax.handler.ContentHandler):
             self.note_depth -= 1
             if self.note_depth < 1:
                 self.in_note = False
+                if (self.task == "parallel" and self.in_book
+                   and self.note_type == "marginal"):
+                    chapter = chapter_numeral("".join(self.note_text))
+                    if chapter:
+                        self.start_chapter(chapter)
+                if self.notes:
+                    self.write_note()
+                self.note_text = []
+
+    def endDocument(self):
+        "Actions for the end of the volume"
+
+        if self.task == "parallel":
+            self.write_parallel()
+
+    def write_parallel(self):
+        """Write the verse-aligned versions from facing pages.
+
+        Without a split prefix, print one line per verse with each version
+        in its own tab-separated column. With a prefix, write each version
+        in the convert format plus an alignment index of the first line and
+        token count of each verse in each file."""
+
+        refs = set()
+        for side, label in PARALLEL_SIDES:
+            refs.update(self.parallel[side])
+        refs = sorted(refs, key=int)
+
+        if not self.split:
+            for ref in refs:
+                columns = [ref]
+                for side, label in PARALLEL_SIDES:
+                    columns.append(" ".join(self.parallel[side].get(ref, [])))
+                self.emit("\t".join(columns))
+            return
+
+        streams = {}
+        lines = {}
+        for side, label in PARALLEL_SIDES:
+            streams[side] = open("%s-%s.txt" % (self.split, label), 'w')
+            lines[side] = 0
+        with open("%s.align" % self.split, 'w') as align:
+            for ref in refs:
+                columns = [ref]
+                for side, label in PARALLEL_SIDES:
+                    tokens = self.parallel[side].get(ref, [])
+                    columns.append("%d %d" % (lines[side], len(tokens)))
+                    for token in tokens:
+                        streams[side].write("%s %s\n" % (ref, token))
+                    lines[side] += len(tokens)
+                align.write("\t".join(columns) + "\n")
+        for stream in streams.values():
+            stream.close()
 
 if __name__ == "__main__":
     argparser = argparse.ArgumentParser(
@@ -194,14 +582,46 @@ if __name__ == "__main__":
     argparser_diff = subs.add_parser("compare",
                                      help="Print normalized comparison text")
     argparser_convert = subs.add_parser("convert", help="Print converted text")
+    argparser_parallel = subs.add_parser(
+        "parallel", help="Print versions on facing pages verse by verse")
+    argparser_parallel.add_argument('--split', metavar='<prefix>', type=str,
+                                    help='Write <prefix>-<version>.txt files '
+                                    'and a <prefix>.align index instead')
     argparser.add_argument('--volume', '-v', metavar='<num>', type=int,
                            help='Volume to process.')
+    argparser.add_argument('--pages', '-p', action='store_true',
+                           help='Also write the page map of the volume.')
+    argparser.add_argument('--notes', '-n', action='store_true',
+                           help='Also write the notes of the volume, with '
+                           'an index by reference.')
     argparser.add_argument('--chapter', '-c', metavar='<num>', type=str,
-                           help='Chapter (book) number to process.')
+                           help='Chapter (book) number to process. For '
+                           'parallel, a comma-separated list of the chapters '
+                           'the text runs across.')
 
     args = argparser.parse_args()
-    vol = open(VOLUMES[args.volume], 'r')
+    if args.pages and args.chapter:
+        # swete-pages.py trusts the page map to cover the whole volume
+        argparser.error("the page map is written for whole volumes only")
+    offsets = None
+    if args.pages:
+        # Page offsets are located in the raw bytes of the volume, while
+        # the text is read as always, so the output stays the same
+        with corpus.open_binary(volume_path(args.volume)) as raw:
+            offsets = ByteOffsets(raw.read())
+    vol = corpus.open_text(volume_path(args.volume))
+    notes = None
+    if args.notes:
+        notes = open(notes_path(VOLUMES[args.volume]), 'w', encoding='utf-8')
+    handler = SweteLXX(book=args.chapter, task=args.command,
+                       volume=args.volume, split=getattr(args, "split", None),
+                       offsets=offsets, notes=notes)
     parser = xml.sax.make_parser()
-    parser.setContentHandler(SweteLXX(book=args.chapter, task=args.command,
-                                      volume=args.volume))
+    parser.setContentHandler(handler)
     parser.parse(vol)
+    if args.pages:
+        write_page_map(page_map_path(VOLUMES[args.volume]), handler.pages)
+    if args.notes:
+        notes.close()
+        write_notes_index(notes_path(VOLUMES[args.volume]),
+                          handler.notes_index)
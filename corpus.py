@@ -0,0 +1,163 @@
+#! /usr/bin/env python3
+#
+# corpus.py
+# Helpers for reading the converted Swete LXX books.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import gzip
+import io
+import lzma
+import os
+import re
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Converted books are named like 34-Nahum.txt or 46-Daniel-OldGreek.txt,
+# possibly compressed
+BOOK_FILE_PAT = re.compile(r'^(\d{2})-(.+)\.txt(\.gz|\.xz|\.zst)?$')
+
+# Compressed files are recognized by extension
+COMPRESSED_EXTENSIONS = (".gz", ".xz", ".zst")
+
+
+def strip_compression(path):
+    """Return path without a compression extension, e.g. vol.xml for
+    vol.xml.gz."""
+
+    root, ext = os.path.splitext(path)
+    if ext in COMPRESSED_EXTENSIONS:
+        return root
+    return path
+
+
+def find_file(path):
+    """Return path if it exists, or else the first compressed version of it
+    that does. If there is none, path is returned as it is."""
+
+    if os.path.exists(path):
+        return path
+    for ext in COMPRESSED_EXTENSIONS:
+        if os.path.exists(path + ext):
+            return path + ext
+    return path
+
+
+def open_binary(path):
+    """Open a file for reading bytes, decompressing it as it is read if its
+    extension says it is compressed."""
+
+    ext = os.path.splitext(path)[1]
+    if ext == ".gz":
+        return gzip.open(path, 'rb')
+    elif ext == ".xz":
+        return lzma.open(path, 'rb')
+    elif ext == ".zst":
+        if zstandard is None:
+            raise ImportError("Reading %s needs the zstandard module" % path)
+        raw = open(path, 'rb')
+        return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+    return open(path, 'rb')
+
+
+def open_text(path, encoding='utf-8'):
+    """Open a text file for reading, decompressing it as it is read if its
+    extension says it is compressed."""
+
+    if os.path.splitext(path)[1] in COMPRESSED_EXTENSIONS:
+        return io.TextIOWrapper(open_binary(path), encoding=encoding)
+    return open(path, 'r', encoding=encoding)
+
+
+def book_files(directory="."):
+    """Return the paths of the converted books in directory, in book order."""
+
+    names = [name for name in os.listdir(directory)
+             if BOOK_FILE_PAT.match(name)]
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def book_name(path):
+    """Return the book name of a converted book path, e.g. 34-Nahum."""
+
+    return os.path.splitext(os.path.basename(strip_compression(path)))[0]
+
+
+def split_ref(ref):
+    """Return the (book, chapter, verse) numbers of a packed reference.
+
+    References are packed as BBCCCVVV, as printed by convert-swete.py."""
+
+    ref = int(ref)
+    return (ref // 1000000, ref // 1000 % 1000, ref % 1000)
+
+
+def pack_ref(book, chapter, verse):
+    """Return the packed BBCCCVVV integer for the given reference."""
+
+    return int(book) * 1000000 + int(chapter) * 1000 + int(verse)
+
+
+def format_ref(ref):
+    """Return the packed reference as printed in converted books."""
+
+    return "%08d" % int(ref)
+
+
+def read_tokens(path):
+    """Yield (ref, token) for each line of a converted book.
+
+    The reference is returned as a packed integer."""
+
+    with open_text(path) as book:
+        for line in book:
+            parts = line.split(None, 1)
+            if len(parts) < 2:
+                continue
+            yield int(parts[0]), parts[1].strip()
+
+
+# Columns of `diff -y` output at its default width, once tabs are expanded
+SIDE_BY_SIDE_MARKER = 62
+SIDE_BY_SIDE_RIGHT = 64
+
+
+def read_side_by_side(path):
+    """Yield (marker, left, right) for each line of `diff -y` output.
+
+    The marker is " " for lines in both files, "|" for changed lines, "<"
+    for lines only on the left and ">" for lines only on the right. The
+    text of a side the line is missing from is None."""
+
+    with open_text(path) as diff:
+        for line in diff:
+            line = line.rstrip("\n").expandtabs(8)
+            marker = line[SIDE_BY_SIDE_MARKER:SIDE_BY_SIDE_MARKER + 1] or " "
+            left = line[:SIDE_BY_SIDE_MARKER - 1].strip()
+            right = line[SIDE_BY_SIDE_RIGHT:].strip()
+            if marker == "<":
+                right = None
+            elif marker == ">":
+                left = None
+            yield marker, left, right
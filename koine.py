@@ -32,8 +32,18 @@
 
 
 from __future__ import unicode_literals
+import functools
+import re
 import unicodedata
 
+# Unicode normalization forms. Comparison text is NFC; tokens read from the
+# Swete volumes are NFKC, folding OCR compatibility characters.
+NFC = 'NFC'
+NFKC = 'NFKC'
+
+# Most recently used (text, form) results kept by unicode_normalize
+NORMALIZE_CACHE_SIZE = 1 << 16
+
 # List of stopwords obtained from Perseus Hopper source code and converted to
 # UTF-8 with final sigmas.
 # http://sourceforge.net/projects/perseus-hopper/
@@ -158,6 +168,17 @@ class Trie:
             valuestring += value
         return (valuestring, key)
 
+    def items(self):
+        """Yield each (key, value) pair in the trie, in key order."""
+
+        stack = [("", self.root)]
+        while stack:
+            prefix, node = stack.pop()
+            if node[0] is not None:
+                yield (prefix, node[0])
+            for ch in sorted(node[1], reverse=True):
+                stack.append((prefix + ch, node[1][ch]))
+
 
 def _beta_to_unicode_trie():
     """Return a Trie object configured for betacode conversion."""
@@ -211,12 +232,15 @@ def _beta_to_unicode_trie():
     t.add("S\n",    "\u03C2")
     t.add("S,",     "\u03C2,")
     t.add("S.",     "\u03C2.")
-    t.add("S:",     "\u03C2:")
+    t.add("S:",     "\u03C2\u00B7")
     t.add("S;",     "\u03C2;")
     t.add("S]",     "\u03C2]")
     t.add("S@",     "\u03C2@")
     t.add("S_",     "\u03C2_")
     t.add("S",      "\u03C3")
+    t.add("S1",     "\u03C3")
+    t.add("S2",     "\u03C2")
+    t.add("S3",     "\u03F2")
 
     t.add("T",      "\u03C4")
     t.add("U",      "\u03C5")
@@ -294,8 +318,8 @@ def _beta_to_unicode_trie():
     t.add("*(\A",    "\u1F0B")
     t.add("*A)/",    "\u1F0C")
     t.add("*)/A",    "\u1F0C")
-    t.add("*A(/",    "\u1F0F")
-    t.add("*(/A",    "\u1F0F")
+    t.add("*A(/",    "\u1F0D")
+    t.add("*(/A",    "\u1F0D")
     t.add("*E)",     "\u1F18")
     t.add("*)E",     "\u1F18")
     t.add("*E(",     "\u1F19")
@@ -319,8 +343,8 @@ def _beta_to_unicode_trie():
     t.add("*)/H",    "\u1F2C")
     #
     t.add("*)=H",    "\u1F2E")
-    t.add("(/*H",    "\u1F2F")
-    t.add("*(/H",    "\u1F2F")
+    t.add("(/*H",    "\u1F2D")
+    t.add("*(/H",    "\u1F2D")
     t.add("*I)",     "\u1F38")
     t.add("*)I",     "\u1F38")
     t.add("*I(",     "\u1F39")
@@ -331,8 +355,8 @@ def _beta_to_unicode_trie():
     t.add("*)/I",    "\u1F3C")
     #
     #
-    t.add("*I(/",    "\u1F3F")
-    t.add("*(/I",    "\u1F3F")
+    t.add("*I(/",    "\u1F3D")
+    t.add("*(/I",    "\u1F3D")
     #
     t.add("*O)",     "\u1F48")
     t.add("*)O",     "\u1F48")
@@ -343,8 +367,8 @@ def _beta_to_unicode_trie():
     t.add("*(\O",    "\u1F4B")
     t.add("*O)/",    "\u1F4C")
     t.add("*)/O",    "\u1F4C")
-    t.add("*O(/",    "\u1F4F")
-    t.add("*(/O",    "\u1F4F")
+    t.add("*O(/",    "\u1F4D")
+    t.add("*(/O",    "\u1F4D")
     #
     t.add("*U(",     "\u1F59")
     t.add("*(U",     "\u1F59")
@@ -358,10 +382,12 @@ def _beta_to_unicode_trie():
     t.add("*(W",     "\u1F69")
     #
     #
+    t.add("*W)\\",   "\u1F6A")
+    t.add("*)\\W",   "\u1F6A")
     t.add("*W)/",    "\u1F6C")
     t.add("*)/W",    "\u1F6C")
-    t.add("*W(/",    "\u1F6F")
-    t.add("*(/W",    "\u1F6F")
+    t.add("*W(/",    "\u1F6D")
+    t.add("*(/W",    "\u1F6D")
 
     t.add("*A)=",    "\u1F0E")
     t.add("*)=A",    "\u1F0E")
@@ -426,7 +452,7 @@ def _beta_to_unicode_trie():
     t.add("H=|",    "\u1FC7")
     t.add("W=|",    "\u1FF7")
 
-    t.add("R(",     "\u1FE4")
+    t.add("R(",     "\u1FE5")
     t.add("*R(",    "\u1FEC")
     t.add("*(R",    "\u1FEC")
 
@@ -455,7 +481,7 @@ def _beta_to_unicode_trie():
     t.add(".", ".")
     t.add(",", ",")
     t.add("'", "'")
-    t.add(":", ":")
+    t.add(":", "\u00B7")
     t.add(";", ";")
     t.add("_", "_")
 
@@ -467,6 +493,67 @@ def _beta_to_unicode_trie():
     return t
 
 
+# Characters of Swete's Unicode text with no betacode of their own in the
+# table above, and the betacode they are written as. Both are read back as
+# the apostrophe CATSS marks elision with.
+_unicode_to_beta_extra = (
+    ("\u2019", "'"),
+    ("\u1FBD", "'"),
+)
+
+
+def _unicode_to_beta_trie():
+    """Return the reverse of _beta_to_unicode_trie, from Unicode to betacode.
+
+    Where several betacode spellings give the same character, the standard
+    TLG order for capitals (diacritics between the asterisk and the letter)
+    is preferred. Keys are added in NFC as well, since NFC replaces several
+    of the table's characters (such as those with oxia) with equivalents."""
+
+    candidates = {}
+    for beta, uni in _converter("beta").items():
+        # Final sigma is spelled by what follows it, which is not encoded
+        beta = beta.replace("\n", "")
+        if not uni or not beta:
+            continue
+        tlg_order = beta.startswith("*") and beta[1:2] in ")(/\\=|+"
+        candidates.setdefault(uni, []).append((not tlg_order, beta))
+
+    t = Trie()
+    for uni in sorted(candidates):
+        beta = min(candidates[uni])[1]
+        for key in (uni, unicodedata.normalize('NFC', uni)):
+            if t.find(key) is None:
+                t.add(key, beta)
+    for uni, beta in _unicode_to_beta_extra:
+        if t.find(uni) is None:
+            t.add(uni, beta)
+    return t
+
+
+# Sigma is left out of the trie lookup, since the betacode for it depends on
+# what follows
+_SIGMA_PAT = re.compile('([\u03C3\u03C2])')
+# What may follow a final sigma written as plain S
+_FINAL_SIGMA_NEXT = ",.\u00B7;]@_"
+
+
+# Compiled converter tables, built on first use
+_converters = {}
+
+
+def _converter(name):
+    """Return the named converter trie, "beta" or "unicode", building it
+    once."""
+
+    if name not in _converters:
+        if name == "beta":
+            _converters[name] = _beta_to_unicode_trie()
+        else:
+            _converters[name] = _unicode_to_beta_trie()
+    return _converters[name]
+
+
 def simplify_tag(tag):
     """Simplify the given tag, returning only the POS portion.
 
@@ -486,19 +573,72 @@ def simplify_tag(tag):
 
 
 def convert_to_unicode(text):
-    """Return the given betacode text as Unicode (with diacritics)."""
+    """Return the given betacode text as Unicode (with diacritics).
+
+    Raise ValueError if a token is not betacode."""
 
     result_tokens = []
-    trie = _beta_to_unicode_trie()
+    trie = _converter("beta")
     tokens = text.split()
     for token in tokens:
-        a, b = trie.convert(token)
+        # The end of the token is marked so that a final S reads as final
+        # sigma
+        a, b = trie.convert(token + "\n")
         if b:
-            print((a.encode("UTF-8"), b))
-            raise Exception
+            raise ValueError("Cannot convert %r from betacode" % token)
         result_tokens.append(a)
     result_text = ' '.join(result_tokens)
-    return result_text
+    return unicode_normalize(result_text)
+
+
+def convert_to_betacode(text):
+    """Return the given Unicode text as betacode.
+
+    This is the reverse of convert_to_unicode, and converting its result
+    back gives the same text, in NFC. Sigma is written S, or S1 and S2
+    where S alone would be read as the other form, and the raised dot (ano
+    teleia) is written :. The one loss is that Swete's elision mark, the
+    right single quotation mark, or a koronis comes back as an apostrophe."""
+
+    result_tokens = []
+    trie = _converter("unicode")
+    for token in unicode_normalize(text).split():
+        pieces = _SIGMA_PAT.split(token)
+        beta = []
+        for num, piece in enumerate(pieces):
+            if num % 2:
+                # Plain S is read as final sigma at the end of a token or
+                # before punctuation; elsewhere the form is spelled out
+                following = "".join(pieces[num + 1:])
+                final = not following or following[0] in _FINAL_SIGMA_NEXT
+                if (piece == "\u03C2") == final:
+                    beta.append("S")
+                else:
+                    beta.append("S2" if piece == "\u03C2" else "S1")
+                continue
+            a, b = trie.convert(piece)
+            if b:
+                raise ValueError("Cannot convert %r to betacode" % b)
+            beta.append(a)
+        result_tokens.append("".join(beta))
+    result_text = ' '.join(result_tokens)
+    return unicode_normalize(result_text)
+
+
+def encode_many(texts):
+    """Return a list of the given Unicode texts as betacode.
+
+    Texts are converted once each, for fast conversion of whole books."""
+
+    encoded = {}
+    results = []
+    for text in texts:
+        try:
+            results.append(encoded[text])
+        except KeyError:
+            encoded[text] = convert_to_betacode(text)
+            results.append(encoded[text])
+    return results
 
 
 def strip_diacritics(text):
@@ -512,10 +652,15 @@ def strip_diacritics(text):
     return result_text
 
 
-def unicode_normalize(text):
-    """Return the given text normalized to Unicode NFC."""
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def unicode_normalize(text, form=NFC):
+    """Return the given text normalized to Unicode NFC.
+
+    Pass form=NFKC (or another form) for a different normalization. The
+    most recently used results are cached, since tokens repeat heavily
+    across a corpus."""
 
-    normalized_text = unicodedata.normalize('NFC', text)
+    normalized_text = unicodedata.normalize(form, text)
     return normalized_text
 
 
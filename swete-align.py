@@ -0,0 +1,183 @@
+#! /usr/bin/env python3
+#
+# Align the Swete token stream against several other witnesses at once.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Witnesses are in the one-token-per-line format of convert-swete.py's
+# compare task and the CATSS starter script, with verse numbers on lines of
+# their own. Only the verse numbers of one witness, the reference, are
+# used: the tokens of each other witness are aligned with it as in
+# versify.py, and take the verse of the reference token they line up with,
+# so that a verse number missed or misread in one witness does not shift
+# the rest of it. Each verse is then aligned separately: the witnesses are
+# added one at a time to a profile of columns, each matched against the
+# profile's consensus. The result has one column per witness and a
+# majority vote. Two witnesses that disagree have no majority, so it takes
+# three or more to settle a disagreement.
+
+import argparse
+import collections
+import difflib
+import os
+import re
+import sys
+
+import corpus
+import koine
+import versify
+
+VERSE_PAT = re.compile(r'^\d{3}$')
+GAP = "-"
+UNRESOLVED = "?"
+
+
+def read_witnesses(paths, reference=0):
+    """Return the tokens of each witness split into verses.
+
+    Each result maps (chapter, verse) to a list of tokens. The verses are
+    those of the reference witness, read as versify.read_stream reads
+    them; the tokens of the other witnesses take the verse of the
+    reference token they are aligned with."""
+
+    streams = [versify.read_stream(path) for path in paths]
+    witnesses = []
+    for num, stream in enumerate(streams):
+        if num == reference:
+            refs = [(chapter, verse) for chapter, verse, token in stream]
+        else:
+            refs = versify.renumber(stream, streams[reference])
+        verses = collections.OrderedDict()
+        for (chapter, verse, token), ref in zip(stream, refs):
+            verses.setdefault(ref, []).append(token)
+        witnesses.append(verses)
+    return witnesses
+
+
+def consensus(column):
+    "Return the most common token of a column, ignoring gaps"
+
+    tokens = [token for token in column if token is not None]
+    return collections.Counter(tokens).most_common(1)[0][0]
+
+
+def add_witness(profile, tokens, width):
+    """Return the profile with one more witness aligned into it.
+
+    The profile is a list of columns, each a list of width tokens (None for
+    a gap). Tokens are matched on koine.normalize of the consensus."""
+
+    keys = [koine.normalize(consensus(column)) for column in profile]
+    new_keys = [koine.normalize(token) for token in tokens]
+    matcher = difflib.SequenceMatcher(None, keys, new_keys, autojunk=False)
+    aligned = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        # Pair changed tokens with columns in order; what is left over on
+        # either side is a gap in the other
+        for num in range(max(i2 - i1, j2 - j1)):
+            if i1 + num < i2:
+                column = profile[i1 + num] + [None]
+            else:
+                column = [None] * width + [None]
+            if j1 + num < j2:
+                column[width] = tokens[j1 + num]
+            aligned.append(column)
+    return aligned
+
+
+def align_verse(witnesses, key):
+    "Return the columns of one verse aligned across all witnesses"
+
+    profile = []
+    for width, verses in enumerate(witnesses):
+        profile = add_witness(profile, verses.get(key, []), width)
+    return profile
+
+
+def vote(column):
+    """Return the token most witnesses agree on, GAP if most lack one, or
+    UNRESOLVED if no reading has a majority."""
+
+    counts = collections.Counter(GAP if token is None else token
+                                 for token in column)
+    token, count = counts.most_common(1)[0]
+    if count * 2 > len(column):
+        return token
+    return UNRESOLVED
+
+
+def align(witnesses):
+    """Yield ((chapter, verse), column) across all witnesses, in the verse
+    order of the first witness followed by verses it lacks."""
+
+    keys = list(witnesses[0])
+    seen = set(keys)
+    for verses in witnesses[1:]:
+        for key in verses:
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+    for key in keys:
+        for column in align_verse(witnesses, key):
+            yield key, column
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Align Swete against other witnesses, one column each.')
+    argparser.add_argument('witnesses', metavar='<file>', nargs='+',
+                           help='Token files, Swete first')
+    argparser.add_argument('--book-num', '-n', metavar='<num>', type=int,
+                           default=0, help='Book number for references')
+    argparser.add_argument('--differences', '-d', action='store_true',
+                           help='Only print columns the witnesses disagree on')
+    argparser.add_argument('--reference', '-r', metavar='<num>', type=int,
+                           default=1, help='Witness whose verse numbers are '
+                           'used, counting from 1 (default: Swete)')
+
+    args = argparser.parse_args()
+    if len(args.witnesses) < 2:
+        argparser.error("at least two witnesses are needed")
+    if not 1 <= args.reference <= len(args.witnesses):
+        argparser.error("no witness %d" % args.reference)
+    witnesses = read_witnesses(args.witnesses, args.reference - 1)
+    names = [os.path.splitext(os.path.basename(path))[0]
+             for path in args.witnesses]
+
+    totals = collections.Counter()
+    print("ref\t%s\tvote" % "\t".join(names))
+    for (chapter, verse), column in align(witnesses):
+        result = vote(column)
+        if len(set(column)) == 1:
+            totals["unanimous"] += 1
+            if args.differences:
+                continue
+        elif result == UNRESOLVED:
+            totals["unresolved"] += 1
+        else:
+            totals["majority"] += 1
+        print("%s\t%s\t%s" % (
+            corpus.format_ref(corpus.pack_ref(args.book_num, chapter, verse)),
+            "\t".join(GAP if token is None else token for token in column),
+            result))
+    print("Columns: %d unanimous, %d settled by majority, %d unresolved"
+          % (totals["unanimous"], totals["majority"], totals["unresolved"]),
+          file=sys.stderr)
@@ -0,0 +1,337 @@
+#! /usr/bin/env python3
+#
+# Incrementally rebuild the per-book outputs of the Swete LXX conversion.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import ast
+import collections
+import hashlib
+import importlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import xml.sax
+
+import corpus
+
+swete = importlib.import_module("convert-swete")
+
+# The manifest of what each book was last built from
+BUILD_DIR = "build"
+MANIFEST = os.path.join(BUILD_DIR, "manifest.json")
+# Where the files of a book go once it is corrected
+DONE_DIR = "done"
+
+# Names of books, by the number convert-swete.py gives them: the title of
+# the corrected output of swete-correct.py, <number>-<title>.txt, and the
+# name of the CATSS comparison text, token stream and side-by-side diff,
+# <name>-catss.txt, <name>-swete.txt and <name>.txt. Other books are named
+# by number, e.g. book41, and their token streams kept in build/.
+NAMES = {33: ("Jonah", "jonah"),
+         34: ("Nahum", "nahum"),
+         35: ("Habakuk", "habakuk"),
+         36: ("Zephanaiah", "zeph"),
+         37: ("Haggai", "haggai"),
+         38: ("Zechariah", "zechariah")}
+
+# Scripts each stage runs, beyond its input files. The modules of the
+# repository they import are found from their imports.
+CODE = {"tokens": ["convert-swete.py"],
+        "compare": [],
+        "corrected": ["swete-correct.py"]}
+
+CHAPTER_PAT = re.compile(rb'<div type="textpart" subtype="chapter" n="(\d+)">')
+
+
+def hash_bytes(data):
+    "Return the hex digest used throughout the manifest"
+
+    return hashlib.sha1(data).hexdigest()
+
+
+def hash_file(path):
+    "Return the hash of a file, or None if it does not exist"
+
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as hashed:
+        return hash_bytes(hashed.read())
+
+
+def code_paths(paths):
+    """Return the given scripts and the modules of the repository they
+    import, directly or through each other, sorted.
+
+    Both import statements and importlib.import_module calls with a
+    literal name are followed. Modules not found next to the scripts,
+    such as the standard library, are left out."""
+
+    found = set()
+    todo = list(paths)
+    while todo:
+        path = todo.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(path, 'rb') as source:
+            tree = ast.parse(source.read(), path)
+        names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                names.append(node.module)
+            elif (isinstance(node, ast.Call)
+                  and isinstance(node.func, ast.Attribute)
+                  and node.func.attr == "import_module" and node.args
+                  and isinstance(node.args[0], ast.Constant)):
+                names.append(node.args[0].value)
+        for name in names:
+            module = os.path.join(os.path.dirname(path),
+                                  name.split(".")[0] + ".py")
+            if os.path.exists(module):
+                todo.append(os.path.normpath(module))
+    return sorted(found)
+
+
+def chapter_hashes(volume):
+    """Return the hash of each book div in a volume, keyed by chapter.
+
+    A book runs from its div to the start of the next book."""
+
+    with corpus.open_binary(swete.volume_path(volume)) as vol:
+        data = vol.read()
+    starts = [(match.start(), match.group(1).decode())
+              for match in CHAPTER_PAT.finditer(data)]
+    hashes = {}
+    for num, (start, chapter) in enumerate(starts):
+        end = starts[num + 1][0] if num + 1 < len(starts) else len(data)
+        hashes[chapter] = hash_bytes(data[start:end])
+    return hashes
+
+
+def find_books(volumes):
+    """Return the books of the volumes, name: (number, volume, chapters),
+    in book order, from the chapter hashes of each volume.
+
+    A div which is not a book is built with the book before it."""
+
+    books = collections.OrderedDict()
+    for volume in sorted(volumes):
+        for chapter in sorted(volumes[volume], key=int):
+            num = swete.book_number(volume, chapter)
+            name = NAMES[num][1] if num in NAMES else "book%02d" % num
+            books.setdefault(name, (num, volume, []))[2].append(chapter)
+    return books
+
+
+def book_path(name, suffix):
+    """Return the path of a file of a book, e.g. nahum-swete.txt, which is
+    in done/ if the book's CATSS text is."""
+
+    path = name + suffix
+    if name not in [name for title, name in NAMES.values()]:
+        return os.path.join(BUILD_DIR, path)
+    done = corpus.find_file(os.path.join(DONE_DIR, name + "-catss.txt"))
+    if os.path.exists(done):
+        path = os.path.join(DONE_DIR, path)
+    return path
+
+
+def catss_path(name):
+    "Return the path of the CATSS text of a book, or None"
+
+    path = corpus.find_file(book_path(name, "-catss.txt"))
+    return path if os.path.exists(path) else None
+
+
+def corrected_path(name, num):
+    "Return the path of the corrected output of a book, or None"
+
+    if num not in NAMES:
+        return None
+    return "%d-%s.txt" % (num, NAMES[num][0])
+
+
+def stage_key(inputs):
+    "Return one hash over the named input hashes of a stage"
+
+    return hash_bytes(json.dumps(inputs, sort_keys=True).encode("UTF-8"))
+
+
+class Build:
+    "Compare the inputs of each book's stages against the manifest"
+
+    def __init__(self, force=False):
+        "Load the manifest and hash the shared inputs"
+
+        self.force = force
+        self.manifest = {}
+        if os.path.exists(MANIFEST):
+            with open(MANIFEST, 'r') as manifest:
+                self.manifest = json.load(manifest)
+        self.code = {}
+        for stage, paths in CODE.items():
+            self.code[stage] = {path: hash_file(path)
+                                for path in code_paths(paths)}
+        # Chapter hashes of each volume there is, hashing each once
+        self.volumes = {}
+        for volume in sorted(swete.VOLUMES):
+            if os.path.exists(swete.volume_path(volume)):
+                self.volumes[volume] = chapter_hashes(volume)
+        self.books = find_books(self.volumes)
+
+    def save(self):
+        "Write the manifest"
+
+        with open(MANIFEST, 'w') as manifest:
+            json.dump(self.manifest, manifest, indent=1, sort_keys=True)
+
+    def chapter_hash(self, volume, chapters):
+        "Return the content hash of the divs of a book"
+
+        hashes = [self.volumes[volume][chapter] for chapter in chapters]
+        if len(hashes) == 1:
+            return hashes[0]
+        return hash_bytes(" ".join(hashes).encode("UTF-8"))
+
+    def outputs(self, name):
+        "Return the output paths of a book's tokens and compare stages"
+
+        return {"tokens": book_path(name, "-swete.txt"),
+                "compare": book_path(name, ".txt")}
+
+    def stale(self, name, stage, inputs, output):
+        "Return True if a stage must run"
+
+        entry = self.manifest.setdefault(name, {})
+        return (self.force or entry.get(stage) != stage_key(inputs)
+                or not os.path.exists(output))
+
+    def record(self, name, stage, inputs):
+        "Record the key of a stage that has run to completion"
+
+        self.manifest.setdefault(name, {})[stage] = stage_key(inputs)
+
+    def run_tokens(self, name, output):
+        "Write the compare-mode token stream of a book"
+
+        num, volume, chapters = self.books[name]
+        with open(output, 'w') as out:
+            handler = swete.SweteLXX(book=",".join(chapters), task="compare",
+                                     volume=volume, out=out)
+            parser = xml.sax.make_parser()
+            parser.setContentHandler(handler)
+            with corpus.open_text(swete.volume_path(volume)) as vol:
+                parser.parse(vol)
+
+    def run_compare(self, name, tokens, output):
+        "Write the side-by-side diff of CATSS and Swete, as prep.sh does"
+
+        catss = catss_path(name)
+        temp = None
+        if catss != corpus.strip_compression(catss):
+            # diff reads plain files, so a compressed text is written out
+            with corpus.open_text(catss) as source:
+                with tempfile.NamedTemporaryFile(
+                        'w', encoding='utf-8', suffix="-catss.txt",
+                        delete=False) as temp:
+                    shutil.copyfileobj(source, temp)
+            catss = temp.name
+        command = ["diff", "-y", catss, tokens]
+        try:
+            with open(output, 'w') as out:
+                status = subprocess.call(command, stdout=out)
+        finally:
+            if temp:
+                os.remove(temp.name)
+        # diff exits 1 when the files differ, and 2 on trouble
+        if status > 1:
+            raise subprocess.CalledProcessError(status, command)
+
+    def book(self, name):
+        "Bring the outputs of one book up to date and return what ran"
+
+        num, volume, chapters = self.books[name]
+        catss = catss_path(name)
+        corrected = corrected_path(name, num)
+        outputs = self.outputs(name)
+        ran = []
+
+        inputs = {"xml": self.chapter_hash(volume, chapters),
+                  "code": self.code["tokens"]}
+        if self.stale(name, "tokens", inputs, outputs["tokens"]):
+            self.run_tokens(name, outputs["tokens"])
+            self.record(name, "tokens", inputs)
+            ran.append("tokens")
+        if not catss or not corrected:
+            return ran
+
+        inputs = {"tokens": hash_file(outputs["tokens"]),
+                  "catss": hash_file(catss),
+                  "code": self.code["compare"]}
+        if self.stale(name, "compare", inputs, outputs["compare"]):
+            self.run_compare(name, outputs["tokens"], outputs["compare"])
+            self.record(name, "compare", inputs)
+            ran.append("compare")
+
+        # Corrections are made by hand, so the corrected output is only
+        # reported as stale. A new corrected output takes on current inputs.
+        entry = self.manifest[name]
+        inputs = stage_key({"tokens": hash_file(outputs["tokens"]),
+                            "catss": hash_file(catss),
+                            "code": self.code["corrected"]})
+        corrected_hash = hash_file(corrected)
+        if corrected_hash != entry.get("corrected_output"):
+            entry["corrected_output"] = corrected_hash
+            entry["corrected"] = inputs
+        if entry.get("corrected") != inputs or corrected_hash is None:
+            ran.append("corrected (run swete-correct.py -s %s -d %s -b %s "
+                       "-n %d -o %s)" % (outputs["tokens"], catss,
+                                         NAMES[num][0], num, corrected))
+        return ran
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Rebuild the books whose inputs have changed.')
+    argparser.add_argument('books', metavar='<book>', nargs='*',
+                           help='Books to build, e.g. nahum or book41 '
+                           '(default: all)')
+    argparser.add_argument('--force', '-f', action='store_true',
+                           help='Rebuild even if inputs are unchanged')
+
+    args = argparser.parse_args()
+    if not os.path.isdir(BUILD_DIR):
+        os.mkdir(BUILD_DIR)
+    build = Build(force=args.force)
+    for name in args.books:
+        if name not in build.books:
+            argparser.error("unknown book %s" % name)
+    for name in args.books or build.books:
+        ran = build.book(name)
+        print("%s: %s" % (name, ", ".join(ran) if ran else "up to date"))
+    build.save()
@@ -28,14 +28,297 @@
 # SOFTWARE.
 
 import argparse
+import bisect
+import collections
+import corpus
 import curses
 import difflib
+import json
+import koine
 import koinenlp
+import os
 import re
+import sys
 
 diff_chars = ["?", "-", "+"]
-menu_choices = ["n", "c", "i", "d", "v", "q"]
+menu_choices = ["n", "c", "i", "d", "v", "j", "s", "q"]
 punctuation = [".", ",", ";", "·", "[", "]", "§"]
+# Decisions that are remembered, and may be suggested or applied again
+memory_choices = ["n", "c", "i", "d"]
+# Share of past decisions a suggestion needs before it is applied unasked
+auto_share = 0.9
+
+
+class CorrectionMemory(object):
+    """Remember review decisions across books.
+
+    Decisions are counted by (text, delta text, operation), so that the same
+    OCR confusion met again can be suggested or applied without review.
+    Inserts and deletes have no delta text, and are counted by the text of
+    the lines either side instead. Only decisions made at the keyboard are
+    counted, so that applied ones do not reinforce themselves.
+
+    """
+
+    def __init__(self, path=None, auto_count=3):
+        self.path = path
+        self.auto_count = auto_count
+        self.decisions = {}
+        self.lookups = 0
+        self.hits = 0
+        self.applied = 0
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as memory_file:
+                for text, delta_text, operation, counts in json.load(
+                        memory_file):
+                    self.decisions[(text, delta_text, operation)] = counts
+
+    def suggest(self, text, delta_text, operation):
+        """Return the most common past decision, or None, and whether it
+        is confident enough to apply without asking.
+
+        """
+
+        self.lookups += 1
+        counts = self.decisions.get((text, delta_text or "", operation))
+        if not counts:
+            return None, False
+        self.hits += 1
+        resp = max(counts, key=counts.get)
+        auto = (self.auto_count > 0 and counts[resp] >= self.auto_count
+                and counts[resp] >= auto_share * sum(counts.values()))
+        if auto:
+            self.applied += 1
+        return resp, auto
+
+    def record(self, text, delta_text, operation, resp):
+        """Count a decision."""
+
+        if resp not in memory_choices:
+            return
+        counts = self.decisions.setdefault((text, delta_text or "", operation),
+                                           {})
+        counts[resp] = counts.get(resp, 0) + 1
+
+    def save(self):
+        """Write the decisions back to the memory file."""
+
+        if not self.path:
+            return
+        # One decision per line keeps the file easy to read and diff
+        entries = [json.dumps([text, delta_text, operation, counts],
+                              ensure_ascii=False, sort_keys=True)
+                   for (text, delta_text, operation), counts
+                   in sorted(self.decisions.items())]
+        with open(self.path, 'w', encoding='utf-8') as memory_file:
+            memory_file.write("[\n{}\n]\n".format(",\n".join(entries)))
+
+    def report(self):
+        """Return a summary of the memory hit rate."""
+
+        if self.lookups:
+            rate = 100.0 * self.hits / self.lookups
+        else:
+            rate = 0.0
+        return "Memory: {} of {} decisions found ({:.1f}%), {} applied".format(
+            self.hits, self.lookups, rate, self.applied)
+
+
+class DiffWindow(object):
+    """Step through a stream of diff lines, keeping a bounded window of
+    lines behind the current one for context and ahead of it for lookahead.
+
+    The stream is read only as far as the lookahead needs, so the first
+    decision can be shown as soon as the diff has produced it.
+
+    """
+
+    def __init__(self, lines, behind, index=None):
+        self.lines = iter(lines)
+        self.behind = collections.deque(maxlen=max(behind, 0))
+        self.ahead = collections.deque()
+        self.ahead_positions = collections.deque()
+        self.current = None
+        self.position = None
+        self.line = -1
+        # Every line read is passed to the index, if there is one, for its
+        # place in the source and delta files
+        self.index = index
+
+    def __iter__(self):
+        while self.peek(0) is not None:
+            self.advance()
+            yield self.line, self.current
+
+    def advance(self):
+        """Make the next line the current one."""
+
+        if self.current is not None:
+            self.behind.append(self.current)
+        self.current = self.ahead.popleft()
+        self.position = self.ahead_positions.popleft()
+        self.line += 1
+
+    def peek(self, offset):
+        """Return the line offset lines past the current one, or None past
+        the end of the stream.
+
+        """
+
+        while len(self.ahead) < offset + 1:
+            try:
+                ahead = next(self.lines)
+            except StopIteration:
+                return None
+            self.ahead.append(ahead)
+            if self.index is not None:
+                self.ahead_positions.append(self.index.add(ahead))
+            else:
+                self.ahead_positions.append(None)
+        return self.ahead[offset]
+
+    def diff(self, offset):
+        """Return the diff character of the line offset lines ahead, or
+        None past the end of the stream.
+
+        """
+
+        ahead = self.peek(offset - 1)
+        if ahead is None:
+            return None
+        return ahead[0]
+
+    def context(self, before, after):
+        """Return up to before lines behind the current one, the current
+        line and up to after lines ahead of it. The last line of the stream
+        is never included.
+
+        """
+
+        before_lines = list(self.behind)[-before:] if before > 0 else []
+        after_lines = []
+        for offset in range(after):
+            if self.peek(offset + 1) is None:
+                break
+            after_lines.append(self.peek(offset))
+        if self.peek(0) is None:
+            return before_lines
+        return before_lines + [self.current] + after_lines
+
+
+class DiffIndex(object):
+    """Map each line of the source and delta files to its reference, and
+    each token to the lines it is on, once, for jumping and searching.
+
+    Each file is numbered on its own: references follow its verse numbers,
+    with the chapter going up when the verse number goes down. A line of
+    the diff is placed by how many lines of each file the diff has given up
+    to and including it, so a jump or search ends on the first diff line
+    that gives the line of either file it found.
+
+    """
+
+    def __init__(self, source_lines, delta_lines):
+        self.verse_line = re.compile(r'^\d{3}.*$')
+        self.refs = []
+        self.tokens = []
+        for lines in (source_lines, delta_lines):
+            refs, tokens = self.build(lines)
+            self.refs.append(refs)
+            self.tokens.append(tokens)
+        # Lines of each file the diff has given so far
+        self.read = [0, 0]
+
+    def build(self, lines):
+        """Return the (chapter, verse) of each line, and a dict of the
+        koine.normalize key of each token to the numbers of its lines.
+
+        """
+
+        refs = []
+        tokens = {}
+        chapter = 1
+        verse = 1
+        for num, line in enumerate(lines):
+            text = koine.unicode_normalize(line.strip())
+            if self.verse_line.match(text):
+                old_verse = verse
+                verse = int(text[0:3])
+                # Update chapter if verse num goes down
+                if old_verse > verse:
+                    chapter += 1
+            refs.append((chapter, verse))
+            key = koine.normalize(text)
+            if key:
+                tokens.setdefault(key, []).append(num)
+        return refs, tokens
+
+    def add(self, diff_line):
+        """Return the (source, delta) lines the diff has given up to and
+        including the next line of the diff.
+
+        """
+
+        if diff_line[0] in " -":
+            self.read[0] += 1
+        if diff_line[0] in " +":
+            self.read[1] += 1
+        return tuple(self.read)
+
+    def find_ref(self, position, chapter, verse=None):
+        """Return the (source, delta) line numbers of the first line of each
+        file after position in chapter[:verse], with None for a file without
+        one.
+
+        """
+
+        target = []
+        for refs, start in zip(self.refs, position):
+            num = bisect.bisect_left(refs, (chapter, verse or 0), start)
+            if (num < len(refs) and refs[num][0] == chapter
+               and verse in (None, refs[num][1])):
+                target.append(num)
+            else:
+                target.append(None)
+        return tuple(target)
+
+    def find_token(self, position, key):
+        """Return the (source, delta) line numbers of the first line of each
+        file after position with the token key, with None for a file
+        without one.
+
+        """
+
+        target = []
+        for tokens, start in zip(self.tokens, position):
+            lines = tokens.get(key, [])
+            num = bisect.bisect_left(lines, start)
+            target.append(lines[num] if num < len(lines) else None)
+        return tuple(target)
+
+    @staticmethod
+    def reached(position, target):
+        """Return whether the diff has given a line of target by position."""
+
+        return any(num is not None and read > num
+                   for read, num in zip(position, target))
+
+
+def neighbours(window):
+    """Return the text of the lines either side of the current one, leaving
+    out ? lines, as the context an insert or delete is remembered in.
+
+    """
+
+    before = next((line for line in reversed(window.behind)
+                   if line[0] != "?"), "  ")
+    offset = 0
+    after = window.peek(offset)
+    while after is not None and after[0] == "?":
+        offset += 1
+        after = window.peek(offset)
+    return " ".join(koine.unicode_normalize(line[2:].strip())
+                    for line in (before, after or "  "))
 
 
 def backoff(text, delta_text):
@@ -64,12 +347,9 @@ def backoff(text, delta_text):
     return eval_line
 
 
-def menu(stdscr, text, operation, correct_text=None):
+def menu_options(text, operation, correct_text=None):
 
-    """Draw the menu options in the user interface and return the list of
-    valid options.
-
-    """
+    """Return the valid menu options for an operation."""
 
     # Always at the beginning of the list
     menu_options = {
@@ -86,15 +366,34 @@ def menu(stdscr, text, operation, correct_text=None):
 
     # Always at the end of the list
     menu_options["v"] = "versification"
+    menu_options["j"] = "jump to chapter:verse"
+    menu_options["s"] = "search for a token"
     menu_options["q"] = "quit"
 
+    return menu_options
+
+
+def menu(stdscr, text, operation, correct_text=None, suggestion=None):
+
+    """Draw the menu options in the user interface and return the list of
+    valid options. A suggestion from the correction memory is marked, and
+    may be chosen with Enter.
+
+    """
+
+    options = menu_options(text, operation, correct_text)
+
     # out line based on terminal size minus last line, minus options
     out_line = curses.LINES - (1 + len(menu_choices))
 
     for choice in menu_choices:
-        if choice in menu_options:
-            option_text = "{}) {}".format(choice, menu_options[choice])
-            stdscr.addstr(out_line, 0, option_text)
+        if choice in options:
+            option_text = "{}) {}".format(choice, options[choice])
+            if choice == suggestion:
+                option_text += " [Enter]"
+                stdscr.addstr(out_line, 0, option_text, curses.A_BOLD)
+            else:
+                stdscr.addstr(out_line, 0, option_text)
         else:
             option_text = "{})".format(choice)
             stdscr.addstr(out_line, 0, option_text, curses.A_DIM)
@@ -103,10 +402,52 @@ def menu(stdscr, text, operation, correct_text=None):
         out_line += 1
 
     stdscr.refresh()
-    return menu_options
+    return options
+
 
+def prompt(stdscr, question):
 
-def main(stdscr, book, lines, book_num):
+    """Ask a question on the status line and return the answer typed."""
+
+    stdscr.move(curses.LINES - 1, 0)
+    stdscr.clrtoeol()
+    stdscr.addstr(curses.LINES - 1, 0, question, curses.A_REVERSE)
+    curses.echo()
+    try:
+        answer = stdscr.getstr(curses.LINES - 1, len(question))
+    finally:
+        curses.noecho()
+    return answer.decode("utf-8", "replace").strip()
+
+
+def find_target(index, position, ref, resp, answer):
+    """Return the (source, delta) target line numbers a jump ("j") to a
+    chapter[:verse] or a search ("s") for a token leads to, and None, or
+    None and the reason there is no such line. Only lines after position,
+    at the reference ref, can be reached.
+
+    """
+
+    if resp == "j":
+        ref_match = re.match(r'^(\d+)(?::(\d+))?$', answer)
+        if not ref_match:
+            return None, "Not a chapter:verse: {}".format(answer)
+        chapter = int(ref_match.group(1))
+        verse = ref_match.group(2) and int(ref_match.group(2))
+        if (chapter, verse or 0) <= ref:
+            return None, "Already passed: {}".format(answer)
+        target = index.find_ref(position, chapter, verse)
+    else:
+        key = koine.normalize(answer)
+        if not key:
+            return None, "Nothing to search for"
+        target = index.find_token(position, key)
+    if target == (None, None):
+        return None, "Not found: {}".format(answer)
+    return target, None
+
+
+def main(stdscr, book, lines, book_num, memory, index):
     """The main program loop."""
 
     # Curses set-up
@@ -119,21 +460,32 @@ def main(stdscr, book, lines, book_num):
     verse = 1
 
     skip_lines = 0
+    # Target lines of a jump or search; lines up to them are passed over as
+    # if "n" had been pressed on each
+    seek_target = None
 
     # re set-up
-    verse_line = re.compile('^\d{3}.*$')
+    verse_line = re.compile(r'^\d{3}.*$')
+
+    # Context shown around the line under review
+    context = (curses.LINES - len(menu_choices)) // 2
+    window = DiffWindow(lines, context, index)
 
     # Search each line for differences
-    for line in range(len(lines)):
+    for line, current in window:
 
+        # A jump or search ends on the first line it leads to
+        if (seek_target is not None
+           and index.reached(window.position, seek_target)):
+            seek_target = None
         would_skip_lines = 0
         # Break if lines should be skipped
         if skip_lines > 0:
             skip_lines -= 1
             continue
 
-        diff = lines[line][0]
-        text = koinenlp.unicode_normalize(lines[line][2:].strip())
+        diff = current[0]
+        text = koine.unicode_normalize(current[2:].strip())
         if text in punctuation:
             punct_token = True
         else:
@@ -158,20 +510,14 @@ def main(stdscr, book, lines, book_num):
                 eval_line = True
                 # Delete or correct
                 if diff == "-":
-                    # Avoid barfing on index out of range
-                    try:
-                        next_diff = lines[line+1][0]
-                    except:
-                        next_diff = None
+                    next_diff = window.diff(1)
                     # Correct
                     if next_diff == "+":
                         operation = "correct"
-                        delta_text = koinenlp.unicode_normalize(lines[line+1][2:].strip())
+                        delta_text = koine.unicode_normalize(
+                            window.peek(0)[2:].strip())
                         # check for yet another diff
-                        try:
-                            ultimate_diff = lines[line+2][0]
-                        except:
-                            ultimate_diff = None
+                        ultimate_diff = window.diff(2)
 
                         if ultimate_diff == "?":
                             would_skip_lines = 2
@@ -186,14 +532,12 @@ def main(stdscr, book, lines, book_num):
 
                     elif next_diff == "?":
                         operation = "correct"
-                        delta_text = koinenlp.unicode_normalize(lines[line+2][2:].strip())
+                        delta_text = koine.unicode_normalize(
+                            window.peek(1)[2:].strip())
                         # skip two lines on ? line
                         skip_lines = 2
                         # If there is a subsequent ? line, skip even more
-                        try:
-                            ultimate_diff = lines[line+3][0]
-                        except:
-                            ultimate_diff = None
+                        ultimate_diff = window.diff(3)
                         if ultimate_diff == "?":
                             skip_lines = 3
 
@@ -215,62 +559,96 @@ def main(stdscr, book, lines, book_num):
                     eval_line = False
         # Prepare to work if eval_line is True
         if eval_line:
-            status_line = "L: {} B: {} C: {} V: {}".format(line, book,
-                                                           chapter, verse)
-            stdscr.addstr((curses.LINES - 1), 0, str(status_line),
-                          curses.A_REVERSE)
-            # Show context of up to 5 lines (if possible)
-            context = (curses.LINES - len(menu_choices)) // 2
-            start_line = line - context
-            if start_line < 0:
-                start_line = 0
-            end_line = line + context - 1
-            if end_line > (len(lines) - 1):
-                end_line = len(lines) - 1
-            display_lines = lines[start_line:end_line]
-            for num in range(len(display_lines)):
-                # If this is the line, emphasize
-                if display_lines[num] == lines[line]:
-                    stdscr.addstr(num, 0, display_lines[num],
-                                  curses.A_BOLD)
-                else:
-                    stdscr.addstr(num, 0, display_lines[num],
-                                  curses.color_pair(1))
-
-            stdscr.refresh()
-            # Draw menu until legitimate response is received
-            need_response = True
-            while need_response:
-                options = menu(stdscr, text, operation, delta_text)
-                resp = stdscr.getkey()
-                if resp in options.keys():
-                    # Quit and return corrections thus far
-                    if resp == "q":
-                        return corrections, out_tokens
-                    # Append response to log
+            # Consult the correction memory before asking, except on verse
+            # numbers, which depend on their place in the book
+            if operation == "correct":
+                memory_key = delta_text
+            else:
+                memory_key = neighbours(window)
+            if verse_match or seek_target is not None:
+                suggestion, auto = None, False
+            else:
+                suggestion, auto = memory.suggest(text, memory_key, operation)
+            options = menu_options(text, operation, delta_text)
+            if suggestion not in options:
+                suggestion, auto = None, False
+            if seek_target is not None:
+                resp = "n"
+            elif auto:
+                resp = suggestion
+            else:
+                status_line = "L: {} B: {} C: {} V: {}".format(line, book,
+                                                               chapter, verse)
+                stdscr.addstr((curses.LINES - 1), 0, str(status_line),
+                              curses.A_REVERSE)
+                # Show context of up to 5 lines (if possible)
+                display_lines = window.context(context, context - 2)
+                for num in range(len(display_lines)):
+                    # If this is the line, emphasize
+                    if display_lines[num] == current:
+                        stdscr.addstr(num, 0, display_lines[num],
+                                      curses.A_BOLD)
                     else:
-                        need_response = False
-                        correct_string = "{} {}:{} {}".format(book, chapter,
-                                                              verse,
-                                                              options[resp])
-                        # Only include actual changes
-                        if resp is not "n":
-                            corrections.append(correct_string)
-                        # Append appropriate tokens to out_tokens
-                        if operation == "insert":
-                            if (resp == "i") and (not verse_match):
-                                out_tokens.append(verse_string + text)
+                        stdscr.addstr(num, 0, display_lines[num],
+                                      curses.color_pair(1))
+
+                stdscr.refresh()
+                # Draw menu until legitimate response is received
+                need_response = True
+                while need_response:
+                    options = menu(stdscr, text, operation, delta_text,
+                                   suggestion)
+                    resp = stdscr.getkey()
+                    # Enter accepts the suggestion
+                    if resp in ["\n", "KEY_ENTER"] and suggestion:
+                        resp = suggestion
+                    if resp in ["j", "s"]:
+                        if resp == "j":
+                            question = "Jump to chapter:verse: "
                         else:
-                            if resp == "n":
-                                out_tokens.append(verse_string + text)
-                        if resp == "c":
-                            # Actually skip only if correction made without ?
-                            if would_skip_lines > 0:
-                                skip_lines = would_skip_lines
-                            out_tokens.append(verse_string + delta_text)
-            # TODO flesh-out log here, including bcv, and instructions
-            # And find out what to do with it
-            stdscr.clear()
+                            question = "Search for: "
+                        answer = prompt(stdscr, question)
+                        seek_target, message = find_target(
+                            index, window.position, (chapter, verse), resp,
+                            answer)
+                        if seek_target is None:
+                            stdscr.move(curses.LINES - 1, 0)
+                            stdscr.clrtoeol()
+                            stdscr.addstr(curses.LINES - 1, 0, message,
+                                          curses.A_REVERSE)
+                            continue
+                        # This line and those up to the target stay as
+                        # they are
+                        resp = "n"
+                    if resp in options.keys():
+                        # Quit and return corrections thus far
+                        if resp == "q":
+                            return corrections, out_tokens
+                        need_response = False
+                # TODO flesh-out log here, including bcv, and instructions
+                # And find out what to do with it
+                stdscr.clear()
+
+            # Append response to log, unless it came of the memory or a jump
+            if not verse_match and not auto and seek_target is None:
+                memory.record(text, memory_key, operation, resp)
+            correct_string = "{} {}:{} {}".format(book, chapter, verse,
+                                                  options[resp])
+            # Only include actual changes
+            if resp != "n":
+                corrections.append(correct_string)
+            # Append appropriate tokens to out_tokens
+            if operation == "insert":
+                if (resp == "i") and (not verse_match):
+                    out_tokens.append(verse_string + text)
+            else:
+                if resp == "n":
+                    out_tokens.append(verse_string + text)
+            if resp == "c":
+                # Actually skip only if correction made without ?
+                if would_skip_lines > 0:
+                    skip_lines = would_skip_lines
+                out_tokens.append(verse_string + delta_text)
         # Non-evaluated lines are appended
         else:
             # Do not output verse change tokens and unskipped ? lines
@@ -289,26 +667,41 @@ if __name__ == "__main__":
         description='provides an interface for human correction of \
         machine-corrected Swete LXX OCR results.')
     argparser.add_argument('--source', '-s', metavar='<file>',
-                           type=argparse.FileType('r'), help='Source file' )
+                           type=str, help='Source file (may be compressed)')
     argparser.add_argument('--delta', '-d', metavar='<file>',
-                           type=argparse.FileType('r'), help='Delta file')
+                           type=str, help='Delta file (may be compressed)')
     argparser.add_argument('--book', '-b', metavar='<title>',
                            type=str, help='Book title')
     argparser.add_argument('--num', '-n', metavar='<num>',
                            type=int, help='Book number')
     argparser.add_argument('--out', '-o', metavar='<file>',
                            type=argparse.FileType('w'), help='Output file' )
+    argparser.add_argument('--memory', '-m', metavar='<file>',
+                           type=str, default='correction-memory.json',
+                           help='Correction memory file')
+    argparser.add_argument('--auto', '-a', metavar='<num>',
+                           type=int, default=3,
+                           help='Apply remembered decisions made at least '
+                           'this many times without asking (0 to always ask)')
 
     args = argparser.parse_args()
 
-    source_lines = args.source.readlines()
-    delta_lines = args.delta.readlines()
+    with corpus.open_text(args.source) as source:
+        source_lines = source.readlines()
+    with corpus.open_text(args.delta) as delta:
+        delta_lines = delta.readlines()
     d = difflib.Differ()
-    results = list(d.compare(source_lines, delta_lines))
+    # Consumed as it is produced, a window at a time
+    results = d.compare(source_lines, delta_lines)
 
-    corrections, out_tokens = curses.wrapper(main, args.book, results, args.num)
+    memory = CorrectionMemory(args.memory, args.auto)
+    corrections, out_tokens = curses.wrapper(
+        main, args.book, results, args.num, memory,
+        DiffIndex(source_lines, delta_lines))
+    memory.save()
 
     for correction in corrections:
         print(correction)
+    print(memory.report(), file=sys.stderr)
 
     args.out.writelines("{}\n".format(out_token) for out_token in out_tokens)
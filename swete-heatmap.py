@@ -0,0 +1,199 @@
+#! /usr/bin/env python3
+#
+# Map where the Swete OCR diverges from CATSS, verse by verse.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Reads the `diff -y` output of prep.sh (CATSS on the left, Swete on the
+# right) and counts, per verse, the edits swete-correct.py would ask about:
+# insertions (CATSS only), deletions (Swete only) and substitutions, after
+# the same backoff filtering of trivial differences.
+
+import argparse
+import html
+import importlib
+import os
+import re
+
+import numpy as np
+
+import corpus
+import koine
+
+correct = importlib.import_module("swete-correct")
+
+OPERATIONS = ("insert", "delete", "substitute")
+MARKER_OPERATIONS = {"<": 0, ">": 1, "|": 2}
+VERSE_PAT = re.compile(r'^\d{3}$')
+SHADES = " ░▒▓█"
+
+
+class Divergence:
+    "Edit counts per verse of one book's side-by-side comparison"
+
+    def __init__(self, path):
+        "Read the comparison at path"
+
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        verses = []
+        operations = []
+        wanted = []
+        # Backoff is decided once per distinct pair of texts
+        trivial = {}
+        chapter = 1
+        verse = 0
+        for marker, left, right in corpus.read_side_by_side(path):
+            # Follow the reference from CATSS alone, since Swete's verse
+            # numbers may be missing, repeated or misread
+            if left is not None and VERSE_PAT.match(left):
+                if int(left) < verse:
+                    chapter += 1
+                verse = int(left)
+            if marker not in MARKER_OPERATIONS:
+                continue
+            swete = koine.unicode_normalize(right or "")
+            catss = koine.unicode_normalize(left or "")
+            if marker == "|":
+                if (swete, catss) not in trivial:
+                    trivial[(swete, catss)] = not correct.backoff(swete,
+                                                                  catss)
+                keep = not trivial[(swete, catss)]
+            elif marker == ">":
+                # Stray punctuation is not worth a deletion, as in review
+                keep = bool(swete) and swete not in correct.punctuation
+            else:
+                keep = bool(catss)
+            verses.append(chapter * 1000 + verse)
+            operations.append(MARKER_OPERATIONS[marker])
+            wanted.append(keep)
+
+        wanted = np.array(wanted, dtype=bool)
+        verses = np.array(verses, dtype=np.int64)[wanted]
+        operations = np.array(operations, dtype=np.int64)[wanted]
+        # One row per verse with an edit, one column per operation
+        self.refs, rows = np.unique(verses, return_inverse=True)
+        self.counts = np.zeros((len(self.refs), len(OPERATIONS)),
+                               dtype=np.int64)
+        np.add.at(self.counts, (rows, operations), 1)
+
+    def chapters(self):
+        "Return (chapters, counts) summed over the verses of each chapter"
+
+        chapters, rows = np.unique(self.refs // 1000, return_inverse=True)
+        counts = np.zeros((len(chapters), len(OPERATIONS)), dtype=np.int64)
+        np.add.at(counts, rows, self.counts)
+        return chapters, counts
+
+    def grid(self):
+        "Return a chapter by verse array of total edits"
+
+        totals = self.counts.sum(axis=1)
+        chapter_nums = self.refs // 1000
+        verse_nums = self.refs % 1000
+        grid = np.zeros((chapter_nums.max(initial=0) + 1,
+                         verse_nums.max(initial=0) + 1), dtype=np.int64)
+        grid[chapter_nums, verse_nums] = totals
+        return grid[1:]
+
+
+def print_table(books, by_chapter=False):
+    "Print the counts of each verse, or chapter, as tab separated rows"
+
+    print("book\tref\t%s\ttotal" % "\t".join(OPERATIONS))
+    for book in books:
+        if by_chapter:
+            refs, counts = book.chapters()
+            labels = ["%d" % ref for ref in refs]
+        else:
+            refs, counts = book.refs, book.counts
+            labels = ["%d:%d" % (ref // 1000, ref % 1000) for ref in refs]
+        for label, row in zip(labels, counts):
+            print("%s\t%s\t%s\t%d" % (book.name, label,
+                                      "\t".join(str(num) for num in row),
+                                      row.sum()))
+
+
+def shade_levels(grid, top):
+    "Return the grid scaled to indexes of SHADES, zero only where grid is"
+
+    levels = np.ceil(grid * (len(SHADES) - 1) / max(top, 1)).astype(int)
+    return np.clip(levels, 0, len(SHADES) - 1)
+
+
+def print_heatmap(books):
+    "Print a chapter by verse heatmap of each book to the terminal"
+
+    top = max((book.grid().max(initial=0) for book in books), default=0)
+    for book in books:
+        grid = book.grid()
+        print("%s (darkest = %d edits)" % (book.name, top))
+        for chapter, row in enumerate(shade_levels(grid, top), 1):
+            print("%3d %s" % (chapter, "".join(SHADES[level]
+                                               for level in row[1:])))
+        print()
+
+
+def write_html(books, out):
+    "Write a chapter by verse heatmap of each book as an HTML page"
+
+    top = max((book.grid().max(initial=0) for book in books), default=0)
+    out.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+              "<title>Swete OCR divergence</title><style>"
+              "table{border-collapse:collapse;font:10px sans-serif}"
+              "td{width:14px;height:14px;padding:0;text-align:center}"
+              "</style></head><body>\n")
+    for book in books:
+        grid = book.grid()
+        out.write("<h2>%s</h2>\n<table>\n" % html.escape(book.name))
+        for chapter, row in enumerate(grid, 1):
+            out.write("<tr><th>%d</th>" % chapter)
+            for verse, count in enumerate(row[1:], 1):
+                alpha = count / max(top, 1)
+                out.write("<td style=\"background:rgba(200,0,0,%.2f)\" "
+                          "title=\"%d:%d %d\"></td>"
+                          % (alpha, chapter, verse, count))
+            out.write("</tr>\n")
+        out.write("</table>\n")
+    out.write("</body></html>\n")
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Count CATSS/Swete differences per verse and chapter.')
+    argparser.add_argument('diffs', metavar='<file>', nargs='+',
+                           help='diff -y output of prep.sh, e.g. '
+                           'zechariah.txt')
+    argparser.add_argument('--chapter', action='store_true',
+                           help='Count per chapter instead of per verse')
+    argparser.add_argument('--heatmap', action='store_true',
+                           help='Print a heatmap instead of the table')
+    argparser.add_argument('--html', metavar='<file>', type=str,
+                           help='Also write an HTML heatmap to file')
+
+    args = argparser.parse_args()
+    books = [Divergence(path) for path in args.diffs]
+    if args.heatmap:
+        print_heatmap(books)
+    else:
+        print_table(books, args.chapter)
+    if args.html:
+        with open(args.html, 'w', encoding='utf-8') as out:
+            write_html(books, out)
@@ -0,0 +1,290 @@
+#! /usr/bin/env python3
+#
+# Build and query an inverted index of the converted Swete LXX books.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import array
+import bisect
+import json
+import struct
+import sys
+import time
+
+import corpus
+import koine
+
+MAGIC = b"LXXIDX1\n"
+
+# Phrases are indexed as unigrams, bigrams and trigrams of normalized keys
+MAX_GRAM = 3
+
+
+def encode_varint(value, out):
+    "Append value to the bytearray out as a LEB128 varint"
+
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_postings(blob, start, end):
+    "Return the list of positions delta-encoded in blob[start:end]"
+
+    positions = []
+    value = 0
+    shift = 0
+    last = 0
+    for byte in blob[start:end]:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        last += value
+        positions.append(last)
+        value = 0
+        shift = 0
+    return positions
+
+
+def stopword_keys():
+    "Return the set of normalized koine.stopwords"
+
+    return set(koine.normalize(word) for word in koine.stopwords)
+
+
+class IndexBuilder:
+    "Accumulate postings for the normalized token stream of each book"
+
+    def __init__(self, stopwords=False):
+        "Initialize variables"
+
+        self.stopwords = stopword_keys() if stopwords else set()
+        self.postings = {}
+        self.docs = []
+        self.verse_starts = array.array('I')
+        self.verse_refs = array.array('I')
+        self.position = 0
+        # Memoize normalization, since the corpus is highly repetitive
+        self.keys = {}
+
+    def key(self, token):
+        "Return the index key for a token, or None if it is not indexed"
+
+        try:
+            return self.keys[token]
+        except KeyError:
+            key = koine.normalize(token)
+            if not key or key in self.stopwords:
+                key = None
+            self.keys[token] = key
+            return key
+
+    def add_book(self, path):
+        "Add the tokens of the converted book at path"
+
+        self.docs.append((corpus.book_name(path), self.position))
+        window = []
+        for ref, token in corpus.read_tokens(path):
+            key = self.key(token)
+            if key is None:
+                continue
+            if not self.verse_refs or self.verse_refs[-1] != ref:
+                self.verse_starts.append(self.position)
+                self.verse_refs.append(ref)
+            window.append(key)
+            if len(window) > MAX_GRAM:
+                del window[0]
+            # Postings for grams ending here are keyed by their first token
+            for n in range(1, len(window) + 1):
+                gram = " ".join(window[-n:])
+                self.postings.setdefault(gram, []).append(
+                    self.position - n + 1)
+            self.position += 1
+
+    def write(self, path):
+        "Write the index to path in its compact delta-encoded form"
+
+        # Sort on the encoded bytes so readers can bisect the term blob
+        terms = sorted(term.encode("UTF-8") for term in self.postings)
+        term_offsets = array.array('Q', [0])
+        post_offsets = array.array('Q', [0])
+        term_blob = bytearray()
+        post_blob = bytearray()
+        for term in terms:
+            term_blob += term
+            term_offsets.append(len(term_blob))
+            last = 0
+            for position in sorted(set(self.postings[term.decode("UTF-8")])):
+                encode_varint(position - last, post_blob)
+                last = position
+            post_offsets.append(len(post_blob))
+
+        sections = [term_offsets.tobytes(), bytes(term_blob),
+                    post_offsets.tobytes(), bytes(post_blob),
+                    self.verse_starts.tobytes(), self.verse_refs.tobytes()]
+        meta = {"stopwords": bool(self.stopwords),
+                "docs": self.docs,
+                "tokens": self.position,
+                "terms": len(terms),
+                "sections": [len(section) for section in sections]}
+        meta = json.dumps(meta).encode("UTF-8")
+        with open(path, 'wb') as out:
+            out.write(MAGIC)
+            out.write(struct.pack('<I', len(meta)))
+            out.write(meta)
+            for section in sections:
+                out.write(section)
+
+
+class Index:
+    "A persisted index, searched in place"
+
+    def __init__(self, path):
+        "Read the index file at path"
+
+        with open(path, 'rb') as index_file:
+            data = index_file.read()
+        if not data.startswith(MAGIC):
+            raise ValueError("%s is not a Swete LXX index" % path)
+        pos = len(MAGIC)
+        meta_len = struct.unpack_from('<I', data, pos)[0]
+        pos += 4
+        meta = json.loads(data[pos:pos + meta_len].decode("UTF-8"))
+        pos += meta_len
+
+        sections = []
+        for length in meta["sections"]:
+            sections.append(memoryview(data)[pos:pos + length])
+            pos += length
+        self.term_offsets = sections[0].cast('Q')
+        self.term_blob = sections[1]
+        self.post_offsets = sections[2].cast('Q')
+        self.post_blob = sections[3]
+        self.verse_starts = sections[4].cast('I')
+        self.verse_refs = sections[5].cast('I')
+
+        self.stopwords = stopword_keys() if meta["stopwords"] else set()
+        self.docs = [name for name, start in meta["docs"]]
+        self.doc_starts = [start for name, start in meta["docs"]]
+        self.nterms = meta["terms"]
+
+    def term(self, num):
+        "Return the encoded term at index num"
+
+        return bytes(self.term_blob[self.term_offsets[num]:
+                                    self.term_offsets[num + 1]])
+
+    def postings(self, gram):
+        "Return the sorted positions of the given gram of index keys"
+
+        target = gram.encode("UTF-8")
+        lo, hi = 0, self.nterms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self.nterms or self.term(lo) != target:
+            return []
+        return decode_postings(self.post_blob, self.post_offsets[lo],
+                               self.post_offsets[lo + 1])
+
+    def keys(self, phrase):
+        "Return the index keys for a phrase, normalized as when indexed"
+
+        keys = []
+        for token in phrase.split():
+            key = koine.normalize(token)
+            if key and key not in self.stopwords:
+                keys.append(key)
+        return keys
+
+    def search(self, phrase):
+        "Return the sorted start positions of phrase in the corpus"
+
+        keys = self.keys(phrase)
+        if not keys:
+            return []
+        if len(keys) <= MAX_GRAM:
+            return self.postings(" ".join(keys))
+        # Longer phrases are the intersection of shifted trigram postings
+        offsets = list(range(0, len(keys) - MAX_GRAM + 1, MAX_GRAM))
+        if offsets[-1] != len(keys) - MAX_GRAM:
+            offsets.append(len(keys) - MAX_GRAM)
+        hits = None
+        for offset in offsets:
+            gram = " ".join(keys[offset:offset + MAX_GRAM])
+            starts = set(pos - offset for pos in self.postings(gram))
+            hits = starts if hits is None else hits & starts
+            if not hits:
+                return []
+        return sorted(hits)
+
+    def locate(self, position):
+        "Return (book name, packed ref) for a corpus position"
+
+        doc = bisect.bisect_right(self.doc_starts, position) - 1
+        verse = bisect.bisect_right(self.verse_starts, position) - 1
+        return self.docs[doc], self.verse_refs[verse]
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Build and query an index of the converted books.')
+    subs = argparser.add_subparsers(dest='command')
+    argparser_build = subs.add_parser("build", help="Build the index")
+    argparser_build.add_argument('books', metavar='<file>', nargs='*',
+                                 help='Converted books (default: all in .)')
+    argparser_build.add_argument('--stopwords', '-s', action='store_true',
+                                 help='Leave koine.stopwords out of the index')
+    argparser_query = subs.add_parser("query", help="Search for a phrase")
+    argparser_query.add_argument('phrase', metavar='<phrase>', type=str,
+                                 help='Word or phrase to search for')
+    argparser_query.add_argument('--count', action='store_true',
+                                 help='Only print the number of hits')
+    argparser.add_argument('--index', '-i', metavar='<file>', type=str,
+                           default='lxx.idx', help='Index file')
+
+    args = argparser.parse_args()
+    if args.command == "build":
+        builder = IndexBuilder(stopwords=args.stopwords)
+        for path in args.books or corpus.book_files():
+            builder.add_book(path)
+        builder.write(args.index)
+    elif args.command == "query":
+        index = Index(args.index)
+        start = time.time()
+        hits = index.search(args.phrase)
+        elapsed = time.time() - start
+        if args.count:
+            print(len(hits))
+        else:
+            for position in hits:
+                name, ref = index.locate(position)
+                print("%s %s" % (name, corpus.format_ref(ref)))
+        print("%d hits in %.2f ms" % (len(hits), elapsed * 1000),
+              file=sys.stderr)
+    else:
+        argparser.print_help()
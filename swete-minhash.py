@@ -0,0 +1,301 @@
+#! /usr/bin/env python3
+#
+# Find parallel passages across the Swete LXX with MinHash and LSH.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Each verse is reduced to the set of its shingles, runs of SHINGLE
+# consecutive koine.normalize keys, and the set to a MinHash signature of
+# PERMUTATIONS values. Two verses agree on any one value with probability
+# equal to the Jaccard similarity of their shingle sets. Signatures are cut
+# into bands, and verses sharing a band bucket are the candidate parallels,
+# so no pair of verses is ever compared unless it is likely to match.
+
+import argparse
+import collections
+import itertools
+
+import numpy as np
+
+import corpus
+import koine
+import swetedb
+
+DEFAULT_INDEX = "lxx.minhash.npz"
+# Parallels such as Kingdoms and Chronicles differ in wording and verse
+# division, so their shingle sets are often only 30% alike; pairs of words
+# and bands of two rows find most of them
+SHINGLE = 2
+PERMUTATIONS = 64
+BANDS = 32
+# Buckets this large hold formulaic verses and are not worth pairing
+MAX_BUCKET = 50
+# Hashes are taken modulo a Mersenne prime small enough that a * x + b,
+# with every term below it, fits in 64 bits
+PRIME = (1 << 31) - 1
+SEED = 1901
+# Signature value of verses without shingles, above any hash
+EMPTY = np.iinfo(np.uint32).max
+
+
+def verse_keys(sources):
+    """Return (names, verse sources, verse refs, verse key ids) of verses.
+
+    sources is a list of (name, tokens), tokens being (ref, token) pairs.
+    Key ids are an array per verse of vocabulary ids of the non-empty
+    normalized tokens."""
+
+    names = []
+    verse_sources = []
+    verse_refs = []
+    verse_ids = []
+    vocab = {}
+    # Memoize normalization, since the corpus is highly repetitive
+    token_ids = {}
+    for num, (name, tokens) in enumerate(sources):
+        names.append(name)
+        for ref, verse in itertools.groupby(tokens, key=lambda pair: pair[0]):
+            ids = []
+            for ref, token in verse:
+                try:
+                    token_id = token_ids[token]
+                except KeyError:
+                    key = koine.normalize(token)
+                    token_id = token_ids[token] = (
+                        vocab.setdefault(key, len(vocab)) if key else -1)
+                if token_id >= 0:
+                    ids.append(token_id)
+            verse_sources.append(num)
+            verse_refs.append(ref)
+            verse_ids.append(np.array(ids, dtype=np.int64))
+    return (names, np.array(verse_sources, dtype=np.int32),
+            np.array(verse_refs, dtype=np.int64), verse_ids)
+
+
+def shingle_hashes(verse_ids, size=SHINGLE):
+    """Return (verse numbers, hashes) of every shingle of every verse.
+
+    Verses shorter than a shingle are taken whole as one shingle."""
+
+    lengths = np.array([len(ids) for ids in verse_ids], dtype=np.int64)
+    ids = np.concatenate(verse_ids) if verse_ids else np.zeros(0, np.int64)
+    owner = np.repeat(np.arange(len(verse_ids)), lengths)
+    starts = np.arange(len(ids))
+    # Polynomial hash of each window of ids; the window at each token stops
+    # at the end of its verse, so short verses hash whole
+    ends = np.minimum(starts + size, np.repeat(np.cumsum(lengths), lengths))
+    hashes = np.zeros(len(ids), dtype=np.uint64)
+    for offset in range(size):
+        pos = np.minimum(starts + offset, len(ids) - 1)
+        inside = starts + offset < ends
+        term = (ids[pos].astype(np.uint64) + np.uint64(1)) * inside
+        hashes = hashes * np.uint64(1000003) + term.astype(np.uint64)
+    # Keep full windows, and the first window of verses shorter than one
+    first = np.concatenate([[0], np.cumsum(lengths)[:-1]])[owner]
+    keep = (ends - starts == size) | ((lengths[owner] < size)
+                                     & (starts == first))
+    return owner[keep], hashes[keep] % np.uint64(PRIME)
+
+
+def signatures(verse_ids, permutations=PERMUTATIONS, seed=SEED):
+    """Return the MinHash signature of each verse as a row of uint32.
+
+    Verses without shingles get a row of EMPTY, and never share a bucket
+    with anything."""
+
+    owner, hashes = shingle_hashes(verse_ids)
+    rng = np.random.RandomState(seed)
+    coefficients = rng.randint(1, PRIME, size=(permutations, 2))
+    order = np.argsort(owner, kind='stable')
+    owner, hashes = owner[order], hashes[order]
+    present, starts = np.unique(owner, return_index=True)
+    result = np.full((len(verse_ids), permutations), EMPTY, dtype=np.uint32)
+    for num, (a, b) in enumerate(coefficients):
+        permuted = ((hashes * np.uint64(a) + np.uint64(b))
+                    % np.uint64(PRIME))
+        if len(present):
+            result[present, num] = np.minimum.reduceat(permuted, starts)
+    return result
+
+
+def band_buckets(signature_rows, bands=BANDS):
+    """Return an array of bucket ids of each verse in each band.
+
+    Verses share a bucket id in a band only if their signatures agree on
+    every row of the band."""
+
+    rows = signature_rows.shape[1] // bands
+    buckets = np.empty((len(signature_rows), bands), dtype=np.int64)
+    for band in range(bands):
+        part = np.ascontiguousarray(
+            signature_rows[:, band * rows:(band + 1) * rows])
+        keys = part.view([('', part.dtype)] * rows).ravel()
+        buckets[:, band] = np.unique(keys, return_inverse=True)[1]
+    return buckets
+
+
+class Index:
+    "MinHash signatures of every verse, with LSH buckets for lookups"
+
+    def __init__(self, names, sources, refs, rows):
+        "Keep the signatures and bucket them"
+
+        self.names = list(names)
+        self.sources = sources
+        self.refs = refs
+        self.rows = rows
+        self.buckets = band_buckets(rows)
+        self.empty = np.all(rows == EMPTY, axis=1)
+
+    @classmethod
+    def build(cls, sources):
+        "Return the index of (name, tokens) sources"
+
+        names, verse_sources, refs, verse_ids = verse_keys(sources)
+        return cls(names, verse_sources, refs, signatures(verse_ids))
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX):
+        "Return the index saved at path"
+
+        data = np.load(path, allow_pickle=False)
+        return cls(data["names"], data["sources"], data["refs"],
+                   data["rows"])
+
+    def save(self, path=DEFAULT_INDEX):
+        "Write the index to path"
+
+        np.savez_compressed(path, names=np.array(self.names),
+                            sources=self.sources, refs=self.refs,
+                            rows=self.rows)
+
+    def similarity(self, verse, others):
+        "Return the estimated Jaccard similarity of verse with others"
+
+        return (self.rows[others] == self.rows[verse]).mean(axis=1)
+
+    def candidates(self, verse):
+        "Return the verses sharing a bucket with verse in some band"
+
+        if self.empty[verse]:
+            return np.zeros(0, dtype=np.int64)
+        same = (self.buckets == self.buckets[verse]).any(axis=1)
+        same[verse] = False
+        return np.flatnonzero(same)
+
+    def find(self, ref, source=None):
+        "Return the verse numbers of a ref, in any or the named source"
+
+        found = self.refs == int(ref)
+        if source is not None:
+            found &= self.sources == self.names.index(source)
+        return np.flatnonzero(found)
+
+    def pairs(self, threshold, cross_book=True, max_bucket=MAX_BUCKET):
+        """Yield (similarity, verse, other) of candidate pairs at or above
+        threshold, each pair once."""
+
+        seen = set()
+        # Versions of a book, such as the two of Daniel, are separate sources
+        books = self.sources.astype(np.int64) * 100 + self.refs // 1000000
+        for band in range(self.buckets.shape[1]):
+            groups = collections.defaultdict(list)
+            for verse in np.flatnonzero(~self.empty):
+                groups[self.buckets[verse, band]].append(verse)
+            for members in groups.values():
+                if len(members) < 2 or len(members) > max_bucket:
+                    continue
+                for verse, other in itertools.combinations(members, 2):
+                    if (verse, other) in seen:
+                        continue
+                    seen.add((verse, other))
+                    if cross_book and books[verse] == books[other]:
+                        continue
+                    score = self.similarity(verse, [other])[0]
+                    if score >= threshold:
+                        yield score, verse, other
+
+    def label(self, verse):
+        "Return the source and ref of a verse for printing"
+
+        return "%s %s" % (self.names[self.sources[verse]],
+                          corpus.format_ref(self.refs[verse]))
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Find parallel passages with MinHash and LSH.')
+    argparser.add_argument('--index', '-i', metavar='<file>', type=str,
+                           default=DEFAULT_INDEX, help='Index file')
+    subs = argparser.add_subparsers(dest='command')
+    argparser_build = subs.add_parser("build", help="Build the index")
+    argparser_build.add_argument('books', metavar='<file>', nargs='*',
+                                 help='Converted books (default: all in .)')
+    argparser_build.add_argument('--volumes', '-v', metavar='<num>',
+                                 type=int, nargs='+',
+                                 help='Index whole volumes instead')
+    argparser_query = subs.add_parser("query",
+                                      help="Print parallels of a verse")
+    argparser_query.add_argument('ref', metavar='<ref>', type=str,
+                                 help='Reference as BBCCCVVV')
+    argparser_query.add_argument('--source', '-s', metavar='<name>',
+                                 type=str, help='Source of the verse')
+    argparser_pairs = subs.add_parser("pairs",
+                                      help="Print all parallel verses")
+    argparser_pairs.add_argument('--same-book', action='store_true',
+                                 help='Include pairs within a book')
+    for sub in (argparser_query, argparser_pairs):
+        sub.add_argument('--threshold', '-t', metavar='<num>', type=float,
+                         default=0.3,
+                         help='Least estimated similarity to print')
+
+    args = argparser.parse_args()
+    if args.command == "build":
+        if args.volumes:
+            loading = [(swetedb.VOLUME_SOURCE, itertools.chain.from_iterable(
+                swetedb.volume_tokens(volume) for volume in args.volumes))]
+        else:
+            loading = [(corpus.book_name(path), corpus.read_tokens(path))
+                       for path in args.books or corpus.book_files()]
+        index = Index.build(loading)
+        index.save(args.index)
+        print("Indexed %d verses" % len(index.refs))
+    elif args.command == "query":
+        index = Index.load(args.index)
+        verses = index.find(args.ref, args.source)
+        if not len(verses):
+            raise SystemExit("No verse %s in the index" % args.ref)
+        for verse in verses:
+            others = index.candidates(verse)
+            scores = index.similarity(verse, others)
+            for num in np.argsort(-scores, kind='stable'):
+                if scores[num] >= args.threshold:
+                    print("%.2f\t%s\t%s" % (scores[num], index.label(verse),
+                                            index.label(others[num])))
+    elif args.command == "pairs":
+        index = Index.load(args.index)
+        found = sorted(index.pairs(args.threshold, not args.same_book),
+                       reverse=True)
+        for score, verse, other in found:
+            print("%.2f\t%s\t%s" % (score, index.label(verse),
+                                    index.label(other)))
+    else:
+        argparser.print_help()
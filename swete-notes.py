@@ -0,0 +1,109 @@
+#! /usr/bin/env python3
+#
+# Look up the notes (apparatus and margins) of the Swete LXX by reference.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import bisect
+import importlib
+import os
+import xml.sax
+
+import corpus
+
+swete = importlib.import_module("convert-swete")
+
+
+def build_notes(volume):
+    "Parse the whole volume and write its notes and their index"
+
+    path = swete.notes_path(swete.VOLUMES[volume])
+    with open(path, 'w', encoding='utf-8') as notes:
+        handler = swete.SweteLXX(book=None, task="convert", volume=volume,
+                                 out=open(os.devnull, 'w'), notes=notes)
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(handler)
+        with corpus.open_text(swete.volume_path(volume)) as vol:
+            parser.parse(vol)
+    swete.write_notes_index(path, handler.notes_index)
+
+
+def load_notes_index(volume):
+    "Return the notes index of the volume, building the notes if needed"
+
+    path = swete.notes_path(swete.VOLUMES[volume])
+    if not os.path.exists(path + ".idx"):
+        build_notes(volume)
+    return swete.read_notes_index(path)
+
+
+def notes_for_refs(volume, index, start, end=None):
+    """Return [first, last, page, type, text] of the notes whose references
+    overlap start to end.
+
+    A footnote covers the references of its page, so it is found by any of
+    them. Only the runs of notes found in the index are read from the
+    notes."""
+
+    end = end or start
+    firsts = [row[0] for row in index]
+    hi = bisect.bisect_right(firsts, end)
+    found = []
+    with open(swete.notes_path(swete.VOLUMES[volume]), 'rb') as notes:
+        for first, last, offset, count in index[:hi]:
+            if last < start:
+                continue
+            notes.seek(offset)
+            for num in range(count):
+                line = notes.readline().decode("UTF-8")
+                found.append(line.rstrip("\n").split("\t", 4))
+    return found
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Look up the notes of the Swete volumes by reference.')
+    subs = argparser.add_subparsers(dest='command')
+    subs.add_parser("build", help="Write the notes and index of the volume")
+    argparser_ref = subs.add_parser("ref", help="Print the notes of refs")
+    argparser_ref.add_argument('start', metavar='<ref>', type=str,
+                               help='Reference as BBCCCVVV')
+    argparser_ref.add_argument('end', metavar='<ref>', type=str, nargs='?',
+                               help='Last reference of a range')
+    argparser_ref.add_argument('--type', '-t', metavar='<type>', type=str,
+                               help='Only notes of this type, e.g. footnote')
+    argparser.add_argument('--volume', '-v', metavar='<num>', type=int,
+                           required=True, help='Volume to process.')
+
+    args = argparser.parse_args()
+    if args.command == "build":
+        build_notes(args.volume)
+    elif args.command == "ref":
+        index = load_notes_index(args.volume)
+        for first, last, page, note_type, text in notes_for_refs(
+                args.volume, index, args.start, args.end):
+            if first != last:
+                first = "%s-%s" % (first, last)
+            if not args.type or note_type == args.type:
+                print("%s\tp. %s\t%s\t%s" % (first, page, note_type, text))
+    else:
+        argparser.print_help()
@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+#
+# Navigate the Swete LXX volumes by printed page, using the page map.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+import importlib
+import io
+import os
+import xml.sax
+
+import corpus
+
+swete = importlib.import_module("convert-swete")
+
+
+def build_page_map(volume):
+    "Parse the whole volume and write its page map"
+
+    path = swete.volume_path(volume)
+    with corpus.open_binary(path) as raw:
+        offsets = swete.ByteOffsets(raw.read())
+    handler = swete.SweteLXX(book=None, task="convert", volume=volume,
+                             out=open(os.devnull, 'w'), offsets=offsets)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    with corpus.open_text(path) as vol:
+        parser.parse(vol)
+    swete.write_page_map(swete.page_map_path(path), handler.pages)
+    return handler.pages
+
+
+def load_page_map(volume):
+    "Return the page map of the volume, building it if needed"
+
+    path = swete.page_map_path(swete.VOLUMES[volume])
+    if not os.path.exists(path):
+        return build_page_map(volume)
+    return swete.read_page_map(path)
+
+
+def find_pages(pages, num):
+    """Return the indexes of page num in the page map.
+
+    OCR sometimes prints the same number on two pages, so there may be more
+    than one."""
+
+    found = [idx for idx, page in enumerate(pages) if page[0] == num]
+    if not found:
+        raise SystemExit("No page %s in the page map" % num)
+    return found
+
+
+def pages_for_ref(pages, ref):
+    "Return the pages printing the given reference"
+
+    found = []
+    for page in pages:
+        if page[3] != "-" and int(page[3]) <= int(ref) <= int(page[4]):
+            found.append(page)
+    return found
+
+
+def extract_page(volume, pages, idx, task="convert", out=None):
+    """Print the tokens of one page, reading only its bytes of the volume.
+
+    The slice between this pb and the next is made well-formed by opening
+    the elements that were open at this pb and closing those open at the
+    next, and the parser starts from the reference in effect at the pb."""
+
+    page = pages[idx]
+    # Seeking a compressed volume decompresses up to the page
+    with corpus.open_binary(swete.volume_path(volume)) as vol:
+        vol.seek(page[1])
+        if idx + 1 < len(pages):
+            body = vol.read(pages[idx + 1][1] - page[1])
+            end_stack = pages[idx + 1][6].split("/")
+        else:
+            body = vol.read()
+            end_stack = []
+    prefix = "".join("<%s>" % name for name in page[6].split("/"))
+    suffix = "".join("</%s>" % name for name in reversed(end_stack))
+
+    handler = swete.SweteLXX(book=None, task=task, volume=volume, out=out)
+    if page[5] != "-":
+        handler.in_book = True
+        handler.current_book = page[5][:2]
+        handler.current_chapter = int(page[5][2:5])
+        handler.current_verse = page[5][5:]
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    parser.parse(io.BytesIO(prefix.encode("UTF-8") + body
+                            + suffix.encode("UTF-8")))
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Navigate the Swete volumes by printed page.')
+    subs = argparser.add_subparsers(dest='command')
+    subs.add_parser("build", help="Build the page map of the volume")
+    argparser_page = subs.add_parser("page", help="Print refs on a page")
+    argparser_page.add_argument('page', metavar='<num>', type=str,
+                                help='Printed page number')
+    argparser_ref = subs.add_parser("ref", help="Print pages of a ref")
+    argparser_ref.add_argument('ref', metavar='<ref>', type=str,
+                               help='Reference as BBCCCVVV')
+    argparser_extract = subs.add_parser("extract",
+                                        help="Print the tokens of a page")
+    argparser_extract.add_argument('page', metavar='<num>', type=str,
+                                   help='Printed page number')
+    argparser_extract.add_argument('--task', '-t', type=str,
+                                   choices=["convert", "compare"],
+                                   default="convert", help='Output format')
+    argparser.add_argument('--volume', '-v', metavar='<num>', type=int,
+                           required=True, help='Volume to process.')
+
+    args = argparser.parse_args()
+    if args.command == "build":
+        build_page_map(args.volume)
+    elif args.command == "page":
+        page_map = load_page_map(args.volume)
+        for idx in find_pages(page_map, args.page):
+            page = page_map[idx]
+            print("%s %s %s-%s" % (page[0], page[2], page[3], page[4]))
+    elif args.command == "ref":
+        for page in pages_for_ref(load_page_map(args.volume), args.ref):
+            print("%s %s %s-%s" % (page[0], page[2], page[3], page[4]))
+    elif args.command == "extract":
+        page_map = load_page_map(args.volume)
+        for idx in find_pages(page_map, args.page):
+            extract_page(args.volume, page_map, idx, task=args.task)
+    else:
+        argparser.print_help()
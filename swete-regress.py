@@ -0,0 +1,171 @@
+#! /usr/bin/env python3
+#
+# Locate the verses that changed between two runs of the conversion.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Each output file is hashed as a tree: a hash per verse, a hash per chapter
+# over its verse hashes, and a hash per file over its chapter hashes. A
+# snapshot of the trees is compared top-down against the files as they are
+# now, so only the chapters whose hashes differ are looked into.
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import sys
+
+import corpus
+
+DEFAULT_SNAPSHOT = "regress.json"
+VERSE_PAT = re.compile(r'^\d{3}$')
+REF_PAT = re.compile(r'^\d{8} ')
+
+
+def hash_lines(lines):
+    "Return the hex digest of lines joined by newlines"
+
+    return hashlib.sha1("\n".join(lines).encode("UTF-8")).hexdigest()
+
+
+def verse_lines(path):
+    """Return {(chapter, verse): [lines]} of an output file.
+
+    Converted books give the reference on each line. Compare streams give
+    verse numbers on lines of their own, and chapters are inferred from
+    verse numbers going down; lines before the first are verse 0."""
+
+    verses = {}
+    chapter = 1
+    verse = 0
+    with corpus.open_text(path) as output:
+        for line in output:
+            line = line.rstrip("\n")
+            if REF_PAT.match(line):
+                key = corpus.split_ref(line[:8])[1:]
+            else:
+                if VERSE_PAT.match(line):
+                    if int(line) < verse:
+                        chapter += 1
+                    verse = int(line)
+                key = (chapter, verse)
+            verses.setdefault(key, []).append(line)
+    return verses
+
+
+def hash_tree(path):
+    """Return the hash tree of an output file, as stored in snapshots.
+
+    {"hash": file hash, "chapters": {chapter: {"hash": chapter hash,
+    "verses": {verse: verse hash}}}}, with numbers as strings."""
+
+    chapters = {}
+    for (chapter, verse), lines in sorted(verse_lines(path).items()):
+        chapters.setdefault(str(chapter), {"verses": {}})["verses"][
+            str(verse)] = hash_lines(lines)
+    for node in chapters.values():
+        node["hash"] = hash_lines("%s %s" % item
+                                  for item in sorted(node["verses"].items()))
+    return {"hash": hash_lines("%s %s" % (chapter, chapters[chapter]["hash"])
+                               for chapter in sorted(chapters)),
+            "chapters": chapters}
+
+
+def compare_nodes(old, new, children):
+    "Yield (key, old child, new child) of the children whose hashes differ"
+
+    old_children = old.get(children, {}) if old else {}
+    new_children = new.get(children, {}) if new else {}
+    for key in sorted(set(old_children) | set(new_children), key=int):
+        old_child = old_children.get(key)
+        new_child = new_children.get(key)
+        if old_child is None or new_child is None:
+            yield key, old_child, new_child
+        elif children == "verses" and old_child != new_child:
+            yield key, old_child, new_child
+        elif children != "verses" and old_child["hash"] != new_child["hash"]:
+            yield key, old_child, new_child
+
+
+def changed_verses(old, new):
+    """Yield (chapter, verse, change) of the verses that differ between two
+    hash trees, where change is "changed", "added" or "removed"."""
+
+    if old and new and old["hash"] == new["hash"]:
+        return
+    for chapter, old_chapter, new_chapter in compare_nodes(old, new,
+                                                           "chapters"):
+        for verse, old_verse, new_verse in compare_nodes(old_chapter,
+                                                         new_chapter,
+                                                         "verses"):
+            if old_verse is None:
+                change = "added"
+            elif new_verse is None:
+                change = "removed"
+            else:
+                change = "changed"
+            yield chapter, verse, change
+
+
+def default_outputs():
+    "Return the converted books and the compare streams under done/"
+
+    return corpus.book_files() + sorted(glob.glob(os.path.join(
+        "done", "*-swete.txt")))
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Record or check per-verse hashes of the outputs.')
+    argparser.add_argument('command', choices=["snapshot", "check"],
+                           help='Record the hashes, or compare against them')
+    argparser.add_argument('outputs', metavar='<file>', nargs='*',
+                           help='Output files (default: the converted books '
+                           'and done/*-swete.txt)')
+    argparser.add_argument('--snapshot', '-s', metavar='<file>', type=str,
+                           default=DEFAULT_SNAPSHOT, help='Snapshot file')
+
+    args = argparser.parse_args()
+    outputs = args.outputs or default_outputs()
+
+    if args.command == "snapshot":
+        trees = {path: hash_tree(path) for path in outputs}
+        with open(args.snapshot, 'w') as snapshot:
+            json.dump(trees, snapshot, sort_keys=True)
+        print("Recorded %d files" % len(trees), file=sys.stderr)
+    else:
+        with open(args.snapshot, 'r') as snapshot:
+            trees = json.load(snapshot)
+        # Outputs that have gone missing are reported too
+        if not args.outputs:
+            outputs = sorted(set(outputs) | set(trees))
+        differences = 0
+        for path in outputs:
+            new = hash_tree(path) if os.path.exists(path) else None
+            for chapter, verse, change in changed_verses(trees.get(path),
+                                                         new):
+                print("%s %s:%s %s" % (path, chapter, verse, change))
+                differences += 1
+        print("%d verses differ" % differences, file=sys.stderr)
+        if differences:
+            raise SystemExit(1)
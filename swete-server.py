@@ -0,0 +1,215 @@
+#! /usr/bin/env python3
+#
+# Serve the Swete LXX volumes and converted books from memory over HTTP.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# All requests are GET and answer JSON:
+#
+#   /sources                          names of the loaded texts
+#   /verses?from=<ref>&to=<ref>       [ref, token] pairs in a range of refs
+#   /book?num=<num>                   [ref, token] pairs of a whole book
+#   /normalize?text=<text>            koine.normalize of the text
+#   /betacode?text=<text>             betacode text converted to Unicode
+#   /encode?text=<text>               Unicode text converted to betacode
+#
+# References are packed as BBCCCVVV. /verses and /book read the volumes
+# unless source=<name> names a converted book, e.g. source=34-Nahum.
+
+import argparse
+import bisect
+import http.server
+import importlib
+import io
+import json
+import sys
+import time
+import urllib.parse
+import xml.sax
+
+import corpus
+import koine
+
+swete = importlib.import_module("convert-swete")
+
+VOLUME_SOURCE = "volumes"
+
+
+class Text:
+    "The tokens of one source, searchable by reference"
+
+    def __init__(self):
+        "Initialize variables"
+
+        self.refs = []
+        self.tokens = []
+
+    def add(self, ref, token):
+        "Append a token at a reference"
+
+        self.refs.append(ref)
+        self.tokens.append(token)
+
+    def finish(self):
+        "Sort token positions by reference for range lookups"
+
+        self.order = sorted(range(len(self.refs)),
+                            key=self.refs.__getitem__)
+        self.sorted_refs = [self.refs[pos] for pos in self.order]
+
+    def range(self, start, end):
+        "Return [ref, token] pairs with start <= ref <= end, in text order"
+
+        lo = bisect.bisect_left(self.sorted_refs, start)
+        hi = bisect.bisect_right(self.sorted_refs, end)
+        return [[corpus.format_ref(self.refs[pos]), self.tokens[pos]]
+                for pos in sorted(self.order[lo:hi])]
+
+
+def load_volumes(volumes):
+    "Parse each volume once, returning one Text of all books"
+
+    text = Text()
+    for volume in volumes:
+        out = io.StringIO()
+        handler = swete.SweteLXX(book=None, task="convert", volume=volume,
+                                 out=out)
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(handler)
+        with corpus.open_text(swete.volume_path(volume)) as vol:
+            parser.parse(vol)
+        for line in out.getvalue().splitlines():
+            ref, token = line.split(" ", 1)
+            text.add(int(ref), token)
+    text.finish()
+    return text
+
+
+def load_books(directory):
+    "Read each converted book, returning a Text per book name"
+
+    texts = {}
+    for path in corpus.book_files(directory):
+        text = Text()
+        for ref, token in corpus.read_tokens(path):
+            text.add(ref, token)
+        text.finish()
+        texts[corpus.book_name(path)] = text
+    return texts
+
+
+class CorpusHandler(http.server.BaseHTTPRequestHandler):
+    "Answer requests from the texts held by the server"
+
+    # Keep connections open between requests, and answer without waiting
+    # on Nagle's algorithm
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        "Only log when asked to"
+
+        if self.server.verbose:
+            http.server.BaseHTTPRequestHandler.log_message(self, format,
+                                                           *args)
+
+    def reply(self, status, body):
+        "Send body as JSON"
+
+        data = json.dumps(body, ensure_ascii=False).encode("UTF-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def text(self, params):
+        "Return the Text named by the source parameter"
+
+        source = params.get("source", VOLUME_SOURCE)
+        if source not in self.server.texts:
+            raise KeyError("unknown source %s" % source)
+        return self.server.texts[source]
+
+    def do_GET(self):
+        "Dispatch a request"
+
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            if url.path == "/sources":
+                body = sorted(self.server.texts)
+            elif url.path == "/verses":
+                start = int(params["from"])
+                end = int(params.get("to", start))
+                body = self.text(params).range(start, end)
+            elif url.path == "/book":
+                num = int(params["num"])
+                body = self.text(params).range(corpus.pack_ref(num, 0, 0),
+                                               corpus.pack_ref(num, 999, 999))
+            elif url.path == "/normalize":
+                body = koine.normalize(params["text"])
+            elif url.path == "/betacode":
+                body = koine.convert_to_unicode(params["text"])
+            elif url.path == "/encode":
+                body = koine.convert_to_betacode(params["text"])
+            else:
+                self.reply(404, {"error": "no such request %s" % url.path})
+                return
+        except (KeyError, ValueError) as err:
+            self.reply(400, {"error": str(err)})
+            return
+        except Exception as err:
+            self.reply(500, {"error": repr(err)})
+            return
+        self.reply(200, body)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Serve the Swete LXX from memory over HTTP.')
+    argparser.add_argument('--host', metavar='<host>', type=str,
+                           default='127.0.0.1', help='Address to listen on')
+    argparser.add_argument('--port', '-p', metavar='<num>', type=int,
+                           default=8707, help='Port to listen on')
+    argparser.add_argument('--volumes', metavar='<num>', type=int,
+                           nargs='*', default=sorted(swete.VOLUMES),
+                           help='Volumes to load')
+    argparser.add_argument('--books', '-b', metavar='<dir>', type=str,
+                           default='.', help='Directory of converted books')
+    argparser.add_argument('--verbose', action='store_true',
+                           help='Log each request')
+
+    args = argparser.parse_args()
+    start = time.time()
+    texts = load_books(args.books)
+    texts[VOLUME_SOURCE] = load_volumes(args.volumes)
+    server = http.server.ThreadingHTTPServer((args.host, args.port),
+                                             CorpusHandler)
+    server.texts = texts
+    server.verbose = args.verbose
+    print("Loaded %d texts in %.1f s, serving on http://%s:%d/"
+          % (len(texts), time.time() - start, args.host, args.port),
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,212 @@
+#! /usr/bin/env python3
+#
+# Corpus statistics over the converted Swete LXX books.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import argparse
+
+import numpy as np
+
+import corpus
+import koine
+
+
+class Corpus:
+    "The converted books as arrays of token ids, refs and book numbers"
+
+    def __init__(self, paths):
+        "Load the converted books at paths"
+
+        self.names = []
+        self.vocab = []
+        vocab_ids = {}
+        # Memoize normalization, since the corpus is highly repetitive
+        token_ids = {}
+        ids = []
+        refs = []
+        books = []
+        for num, path in enumerate(paths):
+            self.names.append(corpus.book_name(path))
+            for ref, token in corpus.read_tokens(path):
+                try:
+                    token_id = token_ids[token]
+                except KeyError:
+                    key = koine.normalize(token)
+                    # Punctuation-only tokens normalize to the empty key,
+                    # and are neither types nor tokens
+                    token_id = None
+                    if key:
+                        token_id = vocab_ids.setdefault(key, len(self.vocab))
+                        if token_id == len(self.vocab):
+                            self.vocab.append(key)
+                    token_ids[token] = token_id
+                if token_id is None:
+                    continue
+                ids.append(token_id)
+                refs.append(ref)
+                books.append(num)
+
+        self.ids = np.array(ids, dtype=np.int32)
+        self.refs = np.array(refs, dtype=np.int64)
+        self.books = np.array(books, dtype=np.int32)
+        self.vocab = np.array(self.vocab, dtype=object)
+
+        stop_keys = set(koine.normalize(word) for word in koine.stopwords)
+        self.stop_mask = np.array([key in stop_keys for key in self.vocab],
+                                  dtype=bool)
+
+    def frequencies(self):
+        "Return the count of each token id"
+
+        return np.bincount(self.ids, minlength=len(self.vocab))
+
+    def ranking(self, counts, limit, stopwords=False):
+        "Return (ids, counts) of the highest counts, optionally sans stopwords"
+
+        counts = counts.copy()
+        if stopwords:
+            counts[self.stop_mask] = 0
+        order = np.argsort(-counts, kind='stable')[:limit]
+        order = order[counts[order] > 0]
+        return order, counts[order]
+
+    def type_token_ratios(self, chapters=False):
+        """Return (groups, types, tokens) for each book or chapter.
+
+        Groups are book numbers, or (book, chapter) rows when chapters=True."""
+
+        if chapters:
+            chapter_nums = self.refs // 1000 % 1000
+            keys = self.books.astype(np.int64) * 1000 + chapter_nums
+        else:
+            keys = self.books.astype(np.int64)
+        groups, group_idx = np.unique(keys, return_inverse=True)
+        tokens = np.bincount(group_idx)
+        # Distinct (group, id) pairs give the number of types per group
+        pairs = np.unique(group_idx.astype(np.int64) * len(self.vocab)
+                          + self.ids)
+        types = np.bincount(pairs // len(self.vocab), minlength=len(groups))
+        if chapters:
+            groups = np.stack([groups // 1000, groups % 1000], axis=1)
+        return groups, types, tokens
+
+    def cooccurrences(self, window):
+        """Return (left ids, right ids, counts) of tokens within window.
+
+        Pairs are counted in text order and never across books."""
+
+        if window < 1:
+            raise ValueError("Window must be at least 1, not %d" % window)
+        vocab_size = np.int64(len(self.vocab))
+        pair_keys = []
+        for distance in range(1, window + 1):
+            same_book = self.books[distance:] == self.books[:-distance]
+            left = self.ids[:-distance][same_book].astype(np.int64)
+            right = self.ids[distance:][same_book]
+            pair_keys.append(left * vocab_size + right)
+        pairs, counts = np.unique(np.concatenate(pair_keys),
+                                  return_counts=True)
+        return pairs // vocab_size, pairs % vocab_size, counts
+
+    def collocates(self, key, window):
+        "Return the count of each token id within window of key"
+
+        if window < 1:
+            raise ValueError("Window must be at least 1, not %d" % window)
+        target = np.flatnonzero(self.vocab == key)
+        if not len(target):
+            return np.zeros(len(self.vocab), dtype=np.int64)
+        positions = np.flatnonzero(self.ids == target[0])
+        offsets = np.concatenate([np.arange(-window, 0),
+                                  np.arange(1, window + 1)])
+        neighbors = (positions[:, None] + offsets[None, :]).ravel()
+        origins = np.repeat(positions, len(offsets))
+        valid = (neighbors >= 0) & (neighbors < len(self.ids))
+        neighbors, origins = neighbors[valid], origins[valid]
+        neighbors = neighbors[self.books[neighbors] == self.books[origins]]
+        return np.bincount(self.ids[neighbors], minlength=len(self.vocab))
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Print statistics for the converted books.')
+    subs = argparser.add_subparsers(dest='command')
+    argparser_freq = subs.add_parser("freq", help="Word frequencies")
+    argparser_ttr = subs.add_parser("ttr", help="Type/token ratios")
+    argparser_ttr.add_argument('--chapter', action='store_true',
+                               help='Per chapter instead of per book')
+    argparser_colloc = subs.add_parser("colloc", help="Co-occurrence counts")
+    argparser_colloc.add_argument('word', metavar='<word>', nargs='?',
+                                  help='Word to find collocates of '
+                                  '(default: all pairs)')
+    argparser_colloc.add_argument('--window', '-w', metavar='<num>',
+                                  type=int, default=2,
+                                  help='Window size in tokens')
+    for sub in (argparser_freq, argparser_colloc):
+        sub.add_argument('--limit', '-n', metavar='<num>', type=int,
+                         default=25, help='Number of rows to print')
+        sub.add_argument('--stopwords', '-s', action='store_true',
+                         help='Leave koine.stopwords out of the ranking')
+    for sub in (argparser_freq, argparser_ttr, argparser_colloc):
+        sub.add_argument('--books', '-b', metavar='<file>', nargs='+',
+                         help='Converted books (default: all in .)')
+
+    args = argparser.parse_args()
+    if not args.command:
+        argparser.print_help()
+        raise SystemExit(1)
+    if args.command == "colloc" and args.window < 1:
+        argparser_colloc.error("the window must be at least 1")
+    lxx = Corpus(args.books or corpus.book_files())
+
+    if args.command == "freq":
+        ids, counts = lxx.ranking(lxx.frequencies(), args.limit,
+                                  args.stopwords)
+        for token_id, count in zip(ids, counts):
+            print("%d\t%s" % (count, lxx.vocab[token_id]))
+
+    elif args.command == "ttr":
+        groups, types, tokens = lxx.type_token_ratios(args.chapter)
+        for group, num_types, num_tokens in zip(groups, types, tokens):
+            if args.chapter:
+                label = "%s %d" % (lxx.names[group[0]], group[1])
+            else:
+                label = lxx.names[group]
+            print("%s\t%d\t%d\t%.3f" % (label, num_types, num_tokens,
+                                         num_types / num_tokens))
+
+    elif args.command == "colloc":
+        if args.word:
+            ids, counts = lxx.ranking(
+                lxx.collocates(koine.normalize(args.word), args.window),
+                args.limit, args.stopwords)
+            for token_id, count in zip(ids, counts):
+                print("%d\t%s" % (count, lxx.vocab[token_id]))
+        else:
+            left, right, counts = lxx.cooccurrences(args.window)
+            if args.stopwords:
+                keep = ~(lxx.stop_mask[left] | lxx.stop_mask[right])
+                left, right, counts = left[keep], right[keep], counts[keep]
+            order = np.argsort(-counts, kind='stable')[:args.limit]
+            for num in order:
+                print("%d\t%s %s" % (counts[num], lxx.vocab[left[num]],
+                                     lxx.vocab[right[num]]))
@@ -0,0 +1,394 @@
+#! /usr/bin/env python3
+#
+# Generate synthetic Swete TEI volumes for load testing.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# A real volume is read once into a model: how often each word occurs in the
+# text and in the footnotes, the number of verses in each chapter of each
+# book, and how many words a verse has, words a line and lines a page. A
+# volume N times the size has a book for each real one, in random order and
+# N times as long, drawn from the model in the markup of the real volumes:
+# book divs with a head, pb and lb milestones, verse numbers in the text,
+# and marginal and footnote notes. New word forms turn up at the rate
+# words seen only once do in the real volume, so the vocabulary keeps
+# growing with the size, as a larger collection's would. Books keep the
+# numbers of the real volume, as references give a book two digits; a
+# longer book repeats its chapters, and once they would pass the three
+# digits a reference gives a chapter, its chapters have more verses.
+
+import argparse
+import bisect
+import collections
+import importlib
+import itertools
+import random
+import re
+import xml.sax
+from xml.sax.saxutils import escape
+
+import corpus
+
+swete = importlib.import_module("convert-swete")
+
+SEED = 1901
+GREEK_LETTERS = "αβγδεζηθικλμνξοπρστυφχψω"
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0">
+<teiHeader>
+<fileDesc>
+<titleStmt>
+<title>The Old Testament In Greek (synthetic)</title>
+</titleStmt>
+<publicationStmt>
+<p>Generated by swete-synth.py from volume %d, %d times its size</p>
+</publicationStmt>
+<sourceDesc>
+<p>Drawn at random from a model of the Swete volume</p>
+</sourceDesc>
+</fileDesc>
+</teiHeader>
+<text>
+<body>
+"""
+
+FOOTER = """</body>
+</text>
+</TEI>
+"""
+
+
+REF_MAX = 999
+
+
+def scale_shape(shape, scale):
+    """Return the verses of each chapter of a book scale times as long as
+    one of the given shape, or None if a reference could not number them."""
+
+    repeats = min(scale, REF_MAX // len(shape))
+    longer = -(-scale // repeats)
+    shape = [verses * longer for verses in shape] * repeats
+    if len(shape) > REF_MAX or max(shape) > REF_MAX:
+        return None
+    return shape
+
+
+class Distribution:
+    "Draw values with the frequencies they were counted with"
+
+    def __init__(self, counts):
+        "Keep the values and their cumulative counts"
+
+        self.values = list(counts)
+        self.totals = list(itertools.accumulate(counts[value]
+                                                for value in self.values))
+
+    def draw(self, rng, count=None):
+        "Return one value, or a list of count values"
+
+        if count is None:
+            return self.values[bisect.bisect_right(
+                self.totals, rng.random() * self.totals[-1])]
+        return rng.choices(self.values, cum_weights=self.totals, k=count)
+
+
+class ModelBuilder(xml.sax.handler.ContentHandler):
+    "Count what a volume is made of, for drawing new volumes from"
+
+    def __init__(self):
+        "Start the counts"
+
+        self.words = collections.Counter()
+        self.note_words = collections.Counter()
+        self.marginals = collections.Counter()
+        self.heads = collections.Counter()
+        # Verses of each chapter of each book, as drawn together
+        self.book_shapes = []
+        self.verse_words = collections.Counter()
+        self.line_words = collections.Counter()
+        self.page_lines = collections.Counter()
+        self.note_lengths = collections.Counter()
+        self.lines = 0
+        self.marginal_count = 0
+        self.in_book = False
+        self.in_head = False
+        self.note_type = None
+        self.note_depth = 0
+        self.head = []
+        self.note = []
+        self.verse_pat = re.compile(r'\d{1,3}')
+        self.reset_book()
+
+    def reset_book(self):
+        "Start the counts of a book"
+
+        self.verse = 1
+        self.shape = []
+        self.verses = 1
+        self.verse_length = 0
+        self.line_length = 0
+        self.page_length = 0
+
+    def end_verse(self):
+        "Count the verse just ended, even if it had no words"
+
+        self.verse_words[self.verse_length] += 1
+        self.verse_length = 0
+
+    def end_line(self):
+        "Count the line just ended, if it had words"
+
+        if self.line_length:
+            self.line_words[self.line_length] += 1
+            self.page_length += 1
+        self.line_length = 0
+
+    def startElement(self, name, attrs):
+        "Count milestones and enter books and notes"
+
+        if (name == "div" and "subtype" in attrs.getNames()
+           and attrs.getValue("subtype") == "chapter"):
+            self.in_book = True
+            self.reset_book()
+        elif name == "head":
+            self.in_head = True
+            self.head = []
+        elif name == "note":
+            # Notes may hold notes; the outermost gives the type
+            if not self.note_depth:
+                self.note_type = attrs.get("type", "-")
+                self.note = []
+            self.note_depth += 1
+        elif name == "lb" and self.in_book:
+            self.end_line()
+            self.lines += 1
+        elif name == "pb":
+            self.end_line()
+            if self.page_length:
+                self.page_lines[self.page_length] += 1
+            self.page_length = 0
+
+    def characters(self, data):
+        "Count the words of the text, heads and notes"
+
+        if self.note_type is not None:
+            self.note.append(data)
+        elif self.in_head:
+            self.head.append(data)
+        elif self.in_book:
+            for token in data.split():
+                has_verse = self.verse_pat.match(token)
+                if has_verse:
+                    verse = int(has_verse.group(0))
+                    self.end_verse()
+                    if verse < self.verse:
+                        self.shape.append(self.verses)
+                        self.verses = 0
+                    self.verse = verse
+                    self.verses += 1
+                    token = token[len(has_verse.group(0)):]
+                if token:
+                    self.words[token] += 1
+                    self.verse_length += 1
+                    self.line_length += 1
+
+    def endElement(self, name):
+        "Count the book, head or note just ended"
+
+        if name == "div" and self.in_book:
+            self.end_verse()
+            self.end_line()
+            self.shape.append(self.verses)
+            self.book_shapes.append(self.shape)
+            self.in_book = False
+        elif name == "head" and self.in_head:
+            self.in_head = False
+            if self.in_book:
+                self.heads[" ".join("".join(self.head).split())] += 1
+        elif name == "note":
+            self.note_depth -= 1
+            if self.note_depth:
+                return
+            words = "".join(self.note).split()
+            if self.note_type == "marginal" and self.in_book:
+                self.marginal_count += 1
+                self.marginals[" ".join(words)] += 1
+            elif self.note_type == "footnote" and words:
+                self.note_words.update(words)
+                self.note_lengths[len(words)] += 1
+            self.note_type = None
+
+
+class Model:
+    "Distributions of the parts of a volume"
+
+    def __init__(self, builder):
+        "Turn the counts of a ModelBuilder into distributions"
+
+        for name in ("words", "note_words", "marginals", "heads",
+                     "verse_words", "line_words", "page_lines",
+                     "note_lengths"):
+            setattr(self, name, Distribution(getattr(builder, name)))
+        self.book_shapes = builder.book_shapes
+        self.books = len(self.book_shapes)
+        self.marginal_rate = builder.marginal_count / max(builder.lines, 1)
+        # Good-Turing: words seen once estimate the chance of a new one
+        singles = sum(1 for count in builder.words.values() if count == 1)
+        self.new_word_rate = singles / max(sum(builder.words.values()), 1)
+
+    @classmethod
+    def from_volume(cls, volume):
+        "Return the model of a real volume"
+
+        builder = ModelBuilder()
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(builder)
+        with corpus.open_text(swete.volume_path(volume)) as vol:
+            parser.parse(vol)
+        return cls(builder)
+
+    def new_word(self, rng):
+        "Return a word form made by changing a letter of a known one"
+
+        word = self.words.draw(rng)
+        letters = [num for num, char in enumerate(word) if char.isalpha()]
+        if not letters:
+            return word
+        num = rng.choice(letters)
+        return word[:num] + rng.choice(GREEK_LETTERS) + word[num + 1:]
+
+    def word(self, rng):
+        "Return a word of the text"
+
+        if rng.random() < self.new_word_rate:
+            return self.new_word(rng)
+        return self.words.draw(rng)
+
+
+class VolumeWriter:
+    "Write a synthetic volume, page by page"
+
+    def __init__(self, model, out, rng):
+        "Start on the first page"
+
+        self.model = model
+        self.out = out
+        self.rng = rng
+        self.page = 0
+        self.page_left = 0
+        self.tokens = 0
+
+    def new_page(self):
+        "End the page with its footnote and start the next"
+
+        if self.page:
+            length = self.model.note_lengths.draw(self.rng)
+            self.out.write('<note type="footnote">%s</note>\n' % escape(
+                " ".join(self.model.note_words.draw(self.rng, length))))
+        self.page += 1
+        self.page_left = self.model.page_lines.draw(self.rng)
+        self.out.write('<pb n="%d"/>\n' % self.page)
+
+    def write_line(self, verse, words):
+        "Write a line of text, starting with its lb"
+
+        if self.page_left < 1:
+            self.new_page()
+        self.page_left -= 1
+        if self.rng.random() < self.model.marginal_rate:
+            self.out.write('<note type="marginal">%s</note>' % escape(
+                self.model.marginals.draw(self.rng)))
+        self.out.write('<lb n="%d"/> %s\n' % (verse, escape(" ".join(words))))
+        self.tokens += len(words)
+
+    def write_book(self, number, shape):
+        """Write a book div, chapter by chapter, with the number of verses in
+        each chapter given by shape."""
+
+        self.out.write('<div type="textpart" subtype="chapter" n="%d">\n'
+                       % number)
+        self.new_page()
+        self.out.write('<head>%s</head>\n<p>' % escape(
+            self.model.heads.draw(self.rng)))
+        line = []
+        line_length = self.model.line_words.draw(self.rng)
+        line_verse = 1
+        for chapter, verses in enumerate(shape):
+            for verse in range(1, verses + 1):
+                words = [self.model.word(self.rng) for num in range(
+                    self.model.verse_words.draw(self.rng))]
+                # Numbers misread in the real text make empty verses
+                if not words:
+                    continue
+                # The first verse of the book goes unnumbered, as in Swete
+                if chapter or verse > 1:
+                    words[0] = "%d %s" % (verse, words[0])
+                for word in words:
+                    if not line:
+                        line_verse = verse
+                    line.append(word)
+                    if len(line) >= line_length:
+                        self.write_line(line_verse, line)
+                        line = []
+                        line_length = self.model.line_words.draw(self.rng)
+        if line:
+            self.write_line(line_verse, line)
+        self.out.write('</p>\n</div>\n')
+
+    def write_volume(self, volume, scale):
+        """Write a book for each book of the model's volume, scale times as
+        long."""
+
+        self.out.write(HEADER % (volume, scale))
+        shapes = [scale_shape(shape, scale)
+                  for shape in self.model.book_shapes]
+        self.rng.shuffle(shapes)
+        for number, shape in enumerate(shapes, 1):
+            self.write_book(number, shape)
+        self.out.write(FOOTER)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Write a synthetic TEI volume modeled on a real one.')
+    argparser.add_argument('out', metavar='<file>', type=str,
+                           help='Volume to write')
+    argparser.add_argument('--volume', '-v', metavar='<num>', type=int,
+                           default=3, help='Volume to model.')
+    argparser.add_argument('--scale', '-s', metavar='<num>', type=int,
+                           default=1,
+                           help='Times as long as the real volume')
+    argparser.add_argument('--seed', metavar='<num>', type=int,
+                           default=SEED, help='Random seed')
+
+    args = argparser.parse_args()
+    model = Model.from_volume(args.volume)
+    if args.scale < 1:
+        argparser.error("the scale must be at least 1")
+    if not all(scale_shape(shape, args.scale) for shape in model.book_shapes):
+        argparser.error("at scale %d a book of volume %d has chapters or "
+                        "verses past %d" % (args.scale, args.volume, REF_MAX))
+    with open(args.out, 'w', encoding='utf-8') as out:
+        writer = VolumeWriter(model, out, random.Random(args.seed))
+        writer.write_volume(args.volume, args.scale)
+    print("Wrote %d books, %d pages, %d tokens"
+          % (model.books, writer.page, writer.tokens))
@@ -0,0 +1,254 @@
+#! /usr/bin/env python3
+#
+# Write accepted corrections back into a Swete volume.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# The corrections are the lines printed by swete-correct.py, e.g.
+# "Nahum 1:4 correct ξηραίνων -> ξηραίνων". The book is parsed once to record
+# the byte range of each token in the volume, and each correction is made by
+# replacing the bytes of its token, leaving the rest of the file as it is.
+# Patches of the same length are written in place through mmap; otherwise
+# the volume is copied through with the patches applied, and the page map
+# and notes kept next to it, whose byte offsets no longer hold, are removed
+# to be rebuilt on next use.
+
+import argparse
+import collections
+import importlib
+import mmap
+import os
+import re
+import sys
+import xml.sax
+
+import corpus
+import koine
+
+swete = importlib.import_module("convert-swete")
+
+CORRECTION_PAT = re.compile(r'^(.+) (\d+):(\d+) (\w+)(?: (.*))?$')
+# Bytes copied at a time when the volume is rewritten
+COPY_SIZE = 1 << 20
+
+
+def read_corrections(path):
+    """Return (chapter, verse, operation, text, new text) of each correction.
+
+    Operations other than correct and delete are kept, with a new text of
+    None, so that they can be reported."""
+
+    corrections = []
+    with corpus.open_text(path) as lines:
+        for line in lines:
+            match = CORRECTION_PAT.match(line.rstrip("\n"))
+            if not match:
+                continue
+            book, chapter, verse, operation, text = match.groups()
+            # Versification has no text
+            text = text or ""
+            new_text = None
+            if operation == "correct":
+                text, new_text = text.split(" -> ", 1)
+            elif operation == "delete":
+                new_text = ""
+            corrections.append((int(chapter), int(verse), operation,
+                                koine.unicode_normalize(text), new_text))
+    return corrections
+
+
+def token_positions(volume, chapter):
+    """Return (raw volume, positions) of a book.
+
+    positions maps (chapter, verse) to the (start, end) byte ranges of its
+    tokens, in text order, as emitted in compare mode."""
+
+    path = swete.volume_path(volume)
+    if path != corpus.strip_compression(path):
+        raise SystemExit("Decompress %s to write corrections into it" % path)
+    with open(path, 'rb') as raw:
+        offsets = swete.ByteOffsets(raw.read())
+    found = []
+    handler = swete.SweteLXX(book=chapter, task="compare", volume=volume,
+                             out=open(os.devnull, 'w'), offsets=offsets,
+                             positions=found)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    with corpus.open_text(path) as vol:
+        parser.parse(vol)
+    positions = collections.OrderedDict()
+    for ref, start, end in found:
+        book, chapter_num, verse = corpus.split_ref(ref)
+        positions.setdefault((chapter_num, verse), []).append((start, end))
+    return offsets.data, positions
+
+
+def raw_text(data, start, end):
+    "Return the normalized text of a byte range, as compare mode prints it"
+
+    return koine.unicode_normalize(data[start:end].decode("UTF-8"),
+                                   koine.NFKC)
+
+
+def find_patches(data, positions, corrections):
+    """Return (patches, skipped) for the corrections.
+
+    patches are (start, end, new bytes, correction), sorted by start, and
+    skipped are (correction, reason). A token is only patched where the
+    verse holds as many tokens of its text as there are corrections of it,
+    so that each can be matched to its token in order."""
+
+    wanted = collections.defaultdict(list)
+    skipped = []
+    for correction in corrections:
+        chapter, verse, operation, text, new_text = correction
+        if new_text is None:
+            skipped.append((correction, "has no place in the volume"))
+        else:
+            wanted[(chapter, verse, text)].append(correction)
+
+    patches = []
+    for (chapter, verse, text), found in wanted.items():
+        ranges = [(start, end) for start, end
+                  in positions.get((chapter, verse), [])
+                  if raw_text(data, start, end) == text]
+        if not ranges:
+            reason = "not found in the volume"
+        elif len(ranges) != len(found):
+            reason = "matches %d tokens of the verse" % len(ranges)
+        else:
+            reason = None
+        if reason:
+            skipped.extend((correction, reason) for correction in found)
+            continue
+        for (start, end), correction in zip(ranges, found):
+            new_text = correction[4]
+            # A deleted token takes the space after it along, or where
+            # punctuation follows, the spacing before it, line ends
+            # included, so that the punctuation joins the word before
+            if not new_text and data[end:end + 1] == b" ":
+                end += 1
+            elif not new_text:
+                while start > 0 and data[start - 1:start].isspace():
+                    start -= 1
+            patches.append((start, end, new_text.encode("UTF-8"),
+                            correction))
+    patches.sort(key=lambda patch: patch[0])
+    for before, after in zip(patches, patches[1:]):
+        if before[1] > after[0]:
+            raise ValueError("Overlapping patches at byte %d" % after[0])
+    return patches, skipped
+
+
+def patch_in_place(path, patches):
+    "Overwrite the byte ranges of patches that keep their length"
+
+    with open(path, 'r+b') as vol:
+        with mmap.mmap(vol.fileno(), 0) as mapped:
+            for start, end, new_bytes, correction in patches:
+                mapped[start:end] = new_bytes
+            mapped.flush()
+
+
+def copy_bytes(source, dest, count):
+    "Copy count bytes from source to dest, a block at a time"
+
+    while count > 0:
+        block = source.read(min(count, COPY_SIZE))
+        if not block:
+            break
+        dest.write(block)
+        count -= len(block)
+
+
+def patch_copy(path, patches):
+    """Rewrite the volume with the patches applied, streaming the bytes
+    between them, and replace the original."""
+
+    temp = path + ".tmp"
+    with open(path, 'rb') as source, open(temp, 'wb') as dest:
+        pos = 0
+        for start, end, new_bytes, correction in patches:
+            copy_bytes(source, dest, start - pos)
+            dest.write(new_bytes)
+            source.seek(end)
+            pos = end
+        copy_bytes(source, dest, os.path.getsize(path) - pos)
+    os.replace(temp, path)
+
+
+def remove_sidecars(path):
+    "Remove the page map and notes of a volume, returning those removed"
+
+    removed = []
+    notes = swete.notes_path(path)
+    for sidecar in (swete.page_map_path(path), notes, notes + ".idx"):
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+            removed.append(sidecar)
+    return removed
+
+
+def apply_patches(path, patches):
+    """Apply the patches, in place if none of them changes a length.
+
+    Otherwise the byte offsets after the first patch move, and the page map
+    and notes of the volume are removed."""
+
+    if all(len(new_bytes) == end - start
+           for start, end, new_bytes, correction in patches):
+        patch_in_place(path, patches)
+        return "in place"
+    patch_copy(path, patches)
+    for sidecar in remove_sidecars(path):
+        print("Removed %s, to be rebuilt" % sidecar, file=sys.stderr)
+    return "by copy"
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Write accepted corrections back into a Swete volume.')
+    argparser.add_argument('corrections', metavar='<file>', type=str,
+                           help='Corrections printed by swete-correct.py')
+    argparser.add_argument('--volume', '-v', metavar='<num>', type=int,
+                           required=True, help='Volume to correct.')
+    argparser.add_argument('--chapter', '-c', metavar='<num>', type=str,
+                           required=True,
+                           help='Chapter (book) number the corrections are of')
+    argparser.add_argument('--dry-run', '-n', action='store_true',
+                           help='Print the patches without writing them')
+
+    args = argparser.parse_args()
+    corrections = read_corrections(args.corrections)
+    data, positions = token_positions(args.volume, args.chapter)
+    patches, skipped = find_patches(data, positions, corrections)
+
+    for start, end, new_bytes, correction in patches:
+        print("%d\t%s\t%s" % (start,
+                              data[start:end].decode("UTF-8").strip(),
+                              new_bytes.decode("UTF-8")))
+    for (chapter, verse, operation, text, new_text), reason in skipped:
+        print("Skipped %d:%d %s %s: %s" % (chapter, verse, operation, text,
+                                           reason), file=sys.stderr)
+    if patches and not args.dry_run:
+        how = apply_patches(swete.volume_path(args.volume), patches)
+        print("Wrote %d corrections %s" % (len(patches), how),
+              file=sys.stderr)
@@ -0,0 +1,287 @@
+#! /usr/bin/env python3
+#
+# Store the converted Swete LXX in SQLite for indexed queries.
+#
+# Copyright 2017 Nathan D. Smith <nathan@smithfam.info>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Each source (a converted book, or the volumes parsed whole) is loaded as
+# one row per token, with its packed reference, its book, chapter and verse,
+# and its koine.normalize key. A full-text table holds the normalized text
+# of each verse, when SQLite has FTS5.
+
+import argparse
+import importlib
+import io
+import itertools
+import sqlite3
+import sys
+import time
+import xml.sax
+
+import corpus
+import koine
+
+DEFAULT_DB = "lxx.db"
+VOLUME_SOURCE = "volumes"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    source INTEGER NOT NULL REFERENCES sources(id),
+    pos INTEGER NOT NULL,
+    ref INTEGER NOT NULL,
+    book INTEGER NOT NULL,
+    chapter INTEGER NOT NULL,
+    verse INTEGER NOT NULL,
+    token TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    PRIMARY KEY (source, pos)
+) WITHOUT ROWID;
+"""
+
+# Built after a load, so that rows go in without index maintenance
+INDEXES = {"tokens_ref": "tokens (ref)",
+           "tokens_norm": "tokens (norm)",
+           "tokens_chapter": "tokens (book, chapter)"}
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS verses USING fts5 (
+    text, source UNINDEXED, ref UNINDEXED
+);
+"""
+
+
+def connect(path=DEFAULT_DB):
+    "Return a connection to the database at path, creating its tables"
+
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    try:
+        conn.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:
+        # This SQLite was built without FTS5; search is unavailable
+        pass
+    return conn
+
+
+def has_fts(conn):
+    "Return True if the database has the full-text verse table"
+
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'verses'")
+    return row.fetchone() is not None
+
+
+def volume_tokens(volume):
+    "Yield (ref, token) for the convert output of a whole volume"
+
+    swete = importlib.import_module("convert-swete")
+    out = io.StringIO()
+    handler = swete.SweteLXX(book=None, task="convert", volume=volume,
+                             out=out)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    with corpus.open_text(swete.volume_path(volume)) as vol:
+        parser.parse(vol)
+    for line in out.getvalue().splitlines():
+        ref, token = line.split(" ", 1)
+        yield int(ref), token
+
+
+def token_rows(source_id, tokens):
+    "Yield a tokens table row for each (ref, token)"
+
+    # Memoize normalization, since the corpus is highly repetitive
+    keys = {}
+    for pos, (ref, token) in enumerate(tokens):
+        try:
+            key = keys[token]
+        except KeyError:
+            key = keys[token] = koine.normalize(token)
+        book, chapter, verse = corpus.split_ref(ref)
+        yield (source_id, pos, ref, book, chapter, verse, token, key)
+
+
+def load(conn, sources):
+    """Load (name, tokens) sources, replacing any already loaded by name.
+
+    tokens is an iterable of (ref, token). Everything is inserted in one
+    transaction, and the indexes are built once the rows are in. Return
+    the number of tokens loaded."""
+
+    total = 0
+    fts = has_fts(conn)
+    with conn:
+        # executescript would commit, so statements are run one by one
+        conn.execute("BEGIN")
+        for index in INDEXES:
+            conn.execute("DROP INDEX IF EXISTS %s" % index)
+        for name, tokens in sources:
+            conn.execute("INSERT OR IGNORE INTO sources (name) VALUES (?)",
+                         (name,))
+            source_id = conn.execute("SELECT id FROM sources WHERE name = ?",
+                                     (name,)).fetchone()[0]
+            conn.execute("DELETE FROM tokens WHERE source = ?", (source_id,))
+            before = conn.total_changes
+            conn.executemany("INSERT INTO tokens VALUES (?,?,?,?,?,?,?,?)",
+                             token_rows(source_id, tokens))
+            total += conn.total_changes - before
+            if fts:
+                conn.execute("DELETE FROM verses WHERE source = ?",
+                             (source_id,))
+                # group_concat keeps no order SQLite guarantees, so the
+                # verse text is joined here from tokens read in order
+                rows = conn.execute("SELECT ref, norm FROM tokens "
+                                    "WHERE source = ? AND norm != '' "
+                                    "ORDER BY ref, pos", (source_id,))
+                conn.executemany(
+                    "INSERT INTO verses (text, source, ref) VALUES (?,?,?)",
+                    ((" ".join(norm for ref, norm in verse), source_id, ref)
+                     for ref, verse in itertools.groupby(
+                         rows, key=lambda row: row[0])))
+        for index, columns in INDEXES.items():
+            conn.execute("CREATE INDEX %s ON %s" % (index, columns))
+    conn.execute("ANALYZE")
+    return total
+
+
+def sources(conn):
+    "Return the names of the loaded sources"
+
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sources ORDER BY name")]
+
+
+def verses(conn, start, end=None, source=None):
+    """Return (source, ref, token) with start <= ref <= end, in text order.
+
+    Only the named source is read, if one is given."""
+
+    return conn.execute(
+        "SELECT name, ref, token FROM tokens JOIN sources "
+        "ON sources.id = source WHERE ref BETWEEN ? AND ? "
+        "AND coalesce(? = name, 1) ORDER BY name, pos",
+        (start, start if end is None else end, source)).fetchall()
+
+
+def chapter(conn, book, chapter_num, source=None):
+    """Return (source, ref, token) of one chapter, in text order.
+
+    Only the named source is read, if one is given."""
+
+    return conn.execute(
+        "SELECT name, ref, token FROM tokens JOIN sources "
+        "ON sources.id = source WHERE book = ? AND chapter = ? "
+        "AND coalesce(? = name, 1) ORDER BY name, pos",
+        (book, chapter_num, source)).fetchall()
+
+
+def occurrences(conn, word):
+    "Return (source, ref, token) of each token normalizing like word"
+
+    return conn.execute(
+        "SELECT name, ref, token FROM tokens JOIN sources "
+        "ON sources.id = source WHERE norm = ? ORDER BY name, pos",
+        (koine.normalize(word),)).fetchall()
+
+
+def forms(conn, word):
+    "Return (token, count) of the surface forms normalizing like word"
+
+    return conn.execute(
+        "SELECT token, count(*) AS n FROM tokens WHERE norm = ? "
+        "GROUP BY token ORDER BY n DESC, token",
+        (koine.normalize(word),)).fetchall()
+
+
+def search(conn, phrase):
+    "Return (source, ref) of verses containing phrase, ignoring diacritics"
+
+    key = koine.normalize(phrase)
+    if not key.strip():
+        return []
+    return conn.execute(
+        "SELECT name, ref FROM verses JOIN sources ON sources.id = source "
+        "WHERE verses MATCH ? ORDER BY name, ref",
+        ('"%s"' % key.replace('"', ''),)).fetchall()
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Load the converted books into SQLite and query them.')
+    argparser.add_argument('--db', '-d', metavar='<file>', type=str,
+                           default=DEFAULT_DB, help='Database file')
+    subs = argparser.add_subparsers(dest='command')
+    argparser_load = subs.add_parser("load", help="Load books or volumes")
+    argparser_load.add_argument('books', metavar='<file>', nargs='*',
+                                help='Converted books (default: all in .)')
+    argparser_load.add_argument('--volumes', '-v', metavar='<num>', type=int,
+                                nargs='+', help='Also load whole volumes, '
+                                'together as the source "%s"' % VOLUME_SOURCE)
+    argparser_verses = subs.add_parser("verses", help="Print a ref range")
+    argparser_verses.add_argument('start', metavar='<ref>', type=int,
+                                  help='First reference, as BBCCCVVV')
+    argparser_verses.add_argument('end', metavar='<ref>', type=int,
+                                  nargs='?', help='Last reference')
+    argparser_verses.add_argument('--source', '-s', metavar='<name>',
+                                  type=str, help='Source to read, e.g. '
+                                  '34-Nahum (default: all)')
+    argparser_word = subs.add_parser("word", help="Print a word's places")
+    argparser_word.add_argument('word', metavar='<word>', type=str)
+    argparser_word.add_argument('--forms', '-f', action='store_true',
+                                help='Count surface forms instead')
+    argparser_search = subs.add_parser("search", help="Find a phrase")
+    argparser_search.add_argument('phrase', metavar='<phrase>', type=str)
+
+    args = argparser.parse_args()
+    if not args.command:
+        argparser.print_help()
+        raise SystemExit(1)
+    conn = connect(args.db)
+
+    if args.command == "load":
+        start = time.time()
+        loading = [(corpus.book_name(path), corpus.read_tokens(path))
+                   for path in args.books or corpus.book_files()]
+        if args.volumes:
+            loading.append((VOLUME_SOURCE, itertools.chain.from_iterable(
+                volume_tokens(volume) for volume in args.volumes)))
+        total = load(conn, loading)
+        print("Loaded %d tokens in %.1f s" % (total, time.time() - start),
+              file=sys.stderr)
+    elif args.command == "verses":
+        for name, ref, token in verses(conn, args.start, args.end,
+                                       args.source):
+            print("%s\t%s\t%s" % (name, corpus.format_ref(ref), token))
+    elif args.command == "word":
+        if args.forms:
+            for token, count in forms(conn, args.word):
+                print("%d\t%s" % (count, token))
+        else:
+            for name, ref, token in occurrences(conn, args.word):
+                print("%s\t%s\t%s" % (name, corpus.format_ref(ref), token))
+    elif args.command == "search":
+        if not has_fts(conn):
+            raise SystemExit("This SQLite has no FTS5 support")
+        for name, ref in search(conn, args.phrase):
+            print("%s\t%s" % (name, corpus.format_ref(ref)))
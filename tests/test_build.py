@@ -0,0 +1,57 @@
+import gzip
+import importlib
+import os
+import tempfile
+
+import pytest
+
+pytest.importorskip("koinenlp")
+build = importlib.import_module("swete-build")
+
+
+def test_find_books():
+    volumes = {3: {"6": "a", "7": "b", "14": "c", "15": "d", "20": "e"},
+               1: {"1": "f"}}
+    books = build.find_books(volumes)
+    assert list(books) == ["book01", "jonah", "nahum", "book41", "book46"]
+    assert books["nahum"] == (34, 3, ["7"])
+    # The table of the chapters of Jeremiah is built with Jeremiah
+    assert books["book41"] == (41, 3, ["14", "15"])
+
+
+def test_book_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("done")
+    with gzip.open(os.path.join("done", "nahum-catss.txt.gz"), 'wt',
+                   encoding='utf-8') as gz:
+        gz.write("λῆμμα\n")
+    open("zechariah-catss.txt", 'w').close()
+    assert build.book_path("nahum", "-swete.txt") == os.path.join(
+        "done", "nahum-swete.txt")
+    assert build.catss_path("nahum") == os.path.join(
+        "done", "nahum-catss.txt.gz")
+    assert build.book_path("zechariah", ".txt") == "zechariah.txt"
+    assert build.catss_path("jonah") is None
+    assert build.book_path("book41", "-swete.txt") == os.path.join(
+        "build", "book41-swete.txt")
+    assert build.corrected_path("nahum", 34) == "34-Nahum.txt"
+    assert build.corrected_path("book41", 41) is None
+
+
+def test_compare_reads_compressed_catss(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("done")
+    with gzip.open(os.path.join("done", "nahum-catss.txt.gz"), 'wt',
+                   encoding='utf-8') as gz:
+        gz.write("001\nλῆμμα\nΝινευη\n")
+    with open("tokens.txt", 'w', encoding='utf-8') as tokens:
+        tokens.write("001\nλῆμμα\nΝινευή\n")
+    os.mkdir("tmp")
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "tmp"))
+    build.Build.run_compare(None, "nahum", "tokens.txt", "nahum.txt")
+    with open("nahum.txt", encoding='utf-8') as compare:
+        lines = compare.read().splitlines()
+    assert [line.split()[0] for line in lines] == ["001", "λῆμμα", "Νινευη"]
+    assert "|" in lines[2]
+    # The text written out for diff is removed
+    assert os.listdir("tmp") == []
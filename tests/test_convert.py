@@ -0,0 +1,71 @@
+import importlib
+import io
+import xml.sax
+
+import pytest
+
+import corpus
+
+pytest.importorskip("koinenlp")
+swete = importlib.import_module("convert-swete")
+
+
+@pytest.fixture(scope="module")
+def daniel():
+    "Return the verses of each version of Daniel, on facing pages"
+
+    handler = swete.SweteLXX(book="20,21", task="parallel", volume=3,
+                             out=io.StringIO())
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    with corpus.open_text(swete.volume_path(3)) as volume:
+        parser.parse(volume)
+    return dict((label, handler.parallel[side])
+                for side, label in swete.PARALLEL_SIDES)
+
+
+@pytest.mark.parametrize("volume, div, book", [
+    (1, 1, 1), (2, 1, 13), (3, 7, 34), (3, 14, 41), (3, 15, 41),
+    (3, 20, 46), (3, 21, 47)])
+def test_book_number(volume, div, book):
+    assert swete.book_number(volume, div) == book
+
+
+@pytest.mark.parametrize("text, chapter", [
+    ("I", 1), ("XII", 12), ("ΧΙ", 11), ("1 VI (2)", 6), ("(2) (VI) 1", 6),
+    ("31 (VI) (1)", None), ("(VI) (1) 31", None), ("(IV)", None),
+    ("87", None), ("Syr", None), ("B", None)])
+def test_chapter_numeral(text, chapter):
+    assert swete.chapter_numeral(text) == chapter
+
+
+def test_daniel_is_book_46(daniel):
+    for verses in daniel.values():
+        assert min(verses) == "46001001"
+        assert {ref[:2] for ref in verses} == {"46"}
+
+
+def test_chapters_follow_the_margin(daniel):
+    for verses in daniel.values():
+        assert {int(ref[2:5]) for ref in verses} == set(range(1, 13))
+
+
+def test_first_pages_are_paired(daniel):
+    old, theodotion = daniel["OldGreek"], daniel["Theodotion"]
+    chapter = ["46001%03d" % verse for verse in range(1, 22)]
+    both = [ref for ref in chapter if ref in old and ref in theodotion]
+    assert 3 * len(both) >= 2 * len(chapter)
+    assert "Ἰωακεὶμ" in old["46001001"]
+    assert "Ἰωακεὶμ" in theodotion["46001001"]
+    # A manuscript number at the top of a page is not a verse
+    assert "Ἀβδεναγώ." in old["46001007"]
+    assert "Κύρου" in old["46001021"]
+    assert "Κύρου" in theodotion["46001021"]
+
+
+def test_chapter_begins_before_its_numeral(daniel):
+    # On Old Greek pages the numeral follows the first words of chapter 2
+    old, theodotion = daniel["OldGreek"], daniel["Theodotion"]
+    assert old["46002001"][:4] == ["Καὶ", "ἐν", "τῷ", "ἔτει"]
+    assert "Ἐν" in theodotion["46002001"]
+    assert "Καὶ" not in old["46001001"]
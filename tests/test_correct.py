@@ -0,0 +1,326 @@
+import curses
+import difflib
+import importlib
+import itertools
+import os
+
+import pytest
+
+pytest.importorskip("koinenlp")
+correct = importlib.import_module("swete-correct")
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(HERE, "tests", "data")
+# Book pairs shipped in done/, and their book numbers
+BOOKS = {"nahum": 34, "habakuk": 35, "zeph": 36, "haggai": 37}
+
+
+class FakeScreen:
+    "Stand in for a curses window, answering from scripted keys"
+
+    def __init__(self, keys=(), answers=()):
+        self.keys = itertools.chain(keys, itertools.repeat("n"))
+        self.answers = iter(answers)
+        self.status = []
+        # Lines drawn above the menu between clears, one list per decision
+        self.frames = [[]]
+
+    def clear(self):
+        if self.frames[-1]:
+            self.frames.append([])
+
+    def refresh(self):
+        pass
+
+    def move(self, y, x):
+        pass
+
+    def clrtoeol(self):
+        pass
+
+    def addstr(self, y, x, text, attr=0):
+        if y == curses.LINES - 1:
+            self.status.append(text)
+        elif y < curses.LINES - 1 - len(correct.menu_choices):
+            self.frames[-1].append(text)
+
+    def getkey(self):
+        return next(self.keys)
+
+    def getstr(self, y, x):
+        return next(self.answers).encode("utf-8")
+
+    def shown(self):
+        "Return the status lines of the decisions shown"
+
+        return [text for text in self.status if text.startswith("L: ")]
+
+
+@pytest.fixture(autouse=True)
+def terminal(monkeypatch):
+    "A 24-line terminal, without curses set up"
+
+    monkeypatch.setattr(curses, "LINES", 24, raising=False)
+    monkeypatch.setattr(curses, "init_pair", lambda *args: None)
+    monkeypatch.setattr(curses, "color_pair", lambda num: 0)
+    monkeypatch.setattr(curses, "echo", lambda: None)
+    monkeypatch.setattr(curses, "noecho", lambda: None)
+
+
+def read_pair(book):
+    "Return the source and delta lines of a shipped book pair"
+
+    lines = []
+    for side in ("swete", "catss"):
+        path = os.path.join(HERE, "done", "%s-%s.txt" % (book, side))
+        with open(path, encoding="utf-8") as stream:
+            lines.append(stream.readlines())
+    return lines
+
+
+def run(book, screen, memory=None, title=None, lines=None):
+    """Return (corrections, output tokens) of main() over a book pair, or
+    over the diff lines given."""
+
+    source_lines, delta_lines = read_pair(book)
+    if lines is None:
+        lines = difflib.Differ().compare(source_lines, delta_lines)
+    return correct.main(screen, title or book, lines, BOOKS[book],
+                        memory or correct.CorrectionMemory(None),
+                        correct.DiffIndex(source_lines, delta_lines))
+
+
+def baseline(book):
+    """Return the output tokens of the list-based swete-correct.py with "n"
+    pressed throughout."""
+
+    with open(os.path.join(DATA, "%s-n.txt" % book), encoding="utf-8") as out:
+        return out.read().splitlines()
+
+
+@pytest.mark.parametrize("book", sorted(BOOKS))
+def test_no_change_matches_baseline(book):
+    corrections, out_tokens = run(book, FakeScreen())
+    assert corrections == []
+    assert out_tokens == baseline(book)
+
+
+def test_verse_numbers_only_in_delta_count():
+    # Nahum 3:4 is numbered in CATSS only
+    corrections, out_tokens = run("nahum", FakeScreen())
+    assert "34003004 πορνείας." in out_tokens
+
+
+def test_jump_passes_over_as_no_change():
+    screen = FakeScreen(["j"], ["3:1"])
+    corrections, out_tokens = run("nahum", screen)
+    assert out_tokens == baseline("nahum")
+    assert "C: 3 V: 1" in screen.shown()[1]
+
+
+def test_jump_to_chapter():
+    screen = FakeScreen(["j"], ["2"])
+    corrections, out_tokens = run("zeph", screen)
+    assert out_tokens == baseline("zeph")
+    assert "C: 2 " in screen.shown()[1]
+
+
+def test_search_passes_over_as_no_change():
+    screen = FakeScreen(["s"], ["Προσενχὴ"])
+    corrections, out_tokens = run("habakuk", screen)
+    assert out_tokens == baseline("habakuk")
+    assert "C: 3 V: 1" in screen.shown()[1]
+
+
+@pytest.mark.parametrize("resp, answer, message", [
+    ("j", "1:1", "Already passed: 1:1"),
+    ("j", "9:1", "Not found: 9:1"),
+    ("j", "one", "Not a chapter:verse: one"),
+    ("s", "ξξξ", "Not found: ξξξ"),
+    ("s", ",", "Nothing to search for")])
+def test_unreachable_target(resp, answer, message):
+    screen = FakeScreen([resp], [answer])
+    corrections, out_tokens = run("haggai", screen)
+    assert message in screen.status
+    assert out_tokens == baseline("haggai")
+
+
+def test_index_maps_lines_once():
+    source_lines = ["ἐν\n", "λόγος\n", "002\n", "κυρίου\n", "001\n", "λόγος\n"]
+    delta_lines = ["ἐν\n", "002\n", "λόγος\n", "κυρίου\n"]
+    index = correct.DiffIndex(source_lines, delta_lines)
+    assert index.refs[0] == [(1, 1), (1, 1), (1, 2), (1, 2), (2, 1), (2, 1)]
+    assert index.refs[1] == [(1, 1), (1, 2), (1, 2), (1, 2)]
+    assert index.tokens[0]["λογοσ"] == [1, 5]
+    assert index.find_ref((0, 0), 1, 2) == (2, 1)
+    assert index.find_ref((3, 2), 2) == (4, None)
+    assert index.find_ref((0, 0), 3) == (None, None)
+    assert index.find_token((2, 0), "λογοσ") == (5, 2)
+    assert index.find_token((0, 3), "κυριου") == (3, 3)
+
+
+def test_index_places_diff_lines():
+    index = correct.DiffIndex(["a\n", "b\n"], ["b\n", "c\n"])
+    positions = [index.add(line) for line in
+                 difflib.Differ().compare(["a\n", "b\n"], ["b\n", "c\n"])]
+    assert positions == [(1, 0), (2, 1), (2, 2)]
+    assert not index.reached(positions[0], (1, None))
+    assert index.reached(positions[1], (1, None))
+    assert index.reached(positions[2], (None, 1))
+
+
+def test_scripted_keys_match_baseline():
+    # Saved from the list-based swete-correct.py pressing c, d, i, v and n
+    # in turn, leaving out its "no change" corrections, since it compared
+    # responses with "is not"
+    with open(os.path.join(DATA, "nahum-cdivn.txt"), encoding="utf-8") as out:
+        corrections, out_tokens = out.read().split("\n\n")
+    screen = FakeScreen(itertools.cycle("cdivn"))
+    assert run("nahum", screen, correct.CorrectionMemory(None, 0),
+               "Nahum") == (corrections.splitlines(), out_tokens.splitlines())
+
+
+def test_context_matches_list():
+    source_lines, delta_lines = read_pair("habakuk")
+    lines = list(difflib.Differ().compare(source_lines, delta_lines))
+    screen = FakeScreen()
+    run("habakuk", screen, correct.CorrectionMemory(None, 0),
+        lines=iter(lines))
+    context = (curses.LINES - len(correct.menu_choices)) // 2
+    shown = screen.shown()
+    frames = [frame for frame in screen.frames if frame]
+    assert len(shown) == len(frames) > 100
+    for status, frame in zip(shown, frames):
+        line = int(status.split()[1])
+        # As the list-based version sliced it, never showing the last line
+        start = max(line - context, 0)
+        end = min(line + context - 1, len(lines) - 1)
+        assert frame == lines[start:end]
+
+
+def test_lookahead_is_bounded():
+    source_lines, delta_lines = read_pair("zeph")
+    read = []
+
+    def counted(lines):
+        for line in lines:
+            read.append(line)
+            yield line
+
+    class CountingScreen(FakeScreen):
+        "Note how many diff lines had been read at each decision"
+
+        def __init__(self):
+            FakeScreen.__init__(self)
+            self.read = []
+
+        def getkey(self):
+            self.read.append((int(self.shown()[-1].split()[1]), len(read)))
+            return FakeScreen.getkey(self)
+
+    screen = CountingScreen()
+    run("zeph", screen,
+        lines=counted(difflib.Differ().compare(source_lines, delta_lines)))
+    context = (curses.LINES - len(correct.menu_choices)) // 2
+    assert len(screen.read) > 100
+    # The first decision is shown long before the diff is read through
+    assert screen.read[0][1] < len(read) // 10
+    for line, count in screen.read:
+        assert count <= line + 1 + context
+
+
+def test_window_keeps_bounded_context():
+    window = correct.DiffWindow(("  %d\n" % num for num in range(10)), 2)
+    for line, current in window:
+        if line == 5:
+            break
+    assert list(window.behind) == ["  3\n", "  4\n"]
+    assert len(window.ahead) == 0
+    assert window.diff(2) == " "
+    assert list(window.ahead) == ["  6\n", "  7\n"]
+    assert window.context(1, 1) == ["  4\n", "  5\n", "  6\n"]
+    for line, current in window:
+        pass
+    assert current == "  9\n"
+    assert window.peek(0) is None
+
+
+def test_memory_suggests_most_common_decision():
+    memory = correct.CorrectionMemory(None, auto_count=3)
+    assert memory.suggest("θεος", "θεὸς", "correct") == (None, False)
+    memory.record("θεος", "θεὸς", "correct", "c")
+    memory.record("θεος", "θεὸς", "correct", "c")
+    memory.record("θεος", "θεὸς", "correct", "n")
+    assert memory.suggest("θεος", "θεὸς", "correct") == ("c", False)
+    # Other operations and delta texts are kept apart
+    assert memory.suggest("θεος", "θεὸς", "delete") == (None, False)
+    assert memory.suggest("θεος", "θεός", "correct") == (None, False)
+    assert (memory.lookups, memory.hits, memory.applied) == (4, 1, 0)
+
+
+def test_memory_applies_after_threshold():
+    memory = correct.CorrectionMemory(None, auto_count=3)
+    for num in range(3):
+        memory.record("καὶ", "ἐν καὶ", "delete", "d")
+    assert memory.suggest("καὶ", "ἐν καὶ", "delete") == ("d", True)
+    # Less than 90% of the decisions no longer applies unasked
+    memory.record("καὶ", "ἐν καὶ", "delete", "n")
+    assert memory.suggest("καὶ", "ἐν καὶ", "delete") == ("d", False)
+    for num in range(6):
+        memory.record("καὶ", "ἐν καὶ", "delete", "d")
+    assert memory.suggest("καὶ", "ἐν καὶ", "delete") == ("d", True)
+    assert memory.applied == 2
+    # 0 always asks
+    never = correct.CorrectionMemory(None, auto_count=0)
+    never.decisions = memory.decisions
+    assert never.suggest("καὶ", "ἐν καὶ", "delete") == ("d", False)
+
+
+def test_memory_ignores_navigation():
+    memory = correct.CorrectionMemory(None)
+    for resp in ("q", "j", "s"):
+        memory.record("θεος", "θεὸς", "correct", resp)
+    assert memory.decisions == {}
+
+
+def test_memory_save_and_load(tmp_path):
+    path = str(tmp_path / "correction-memory.json")
+    memory = correct.CorrectionMemory(path)
+    memory.record("θεος", "θεὸς", "correct", "c")
+    memory.record("θεος", "θεὸς", "correct", "c")
+    memory.record("καὶ", None, "insert", "i")
+    memory.save()
+    loaded = correct.CorrectionMemory(path)
+    assert loaded.decisions == {("θεος", "θεὸς", "correct"): {"c": 2},
+                                ("καὶ", "", "insert"): {"i": 1}}
+    assert "θεὸς" in open(path, encoding="utf-8").read()
+    assert "0 of 0" in loaded.report()
+
+
+def test_memory_applies_decisions_in_next_session(tmp_path):
+    path = str(tmp_path / "correction-memory.json")
+    first = FakeScreen()
+    memory = correct.CorrectionMemory(path, auto_count=0)
+    run("nahum", first, memory)
+    memory.save()
+    decisions = memory.decisions
+    assert decisions and all(list(counts) == ["n"]
+                             for counts in decisions.values())
+
+    second = FakeScreen()
+    memory = correct.CorrectionMemory(path, auto_count=1)
+    corrections, out_tokens = run("nahum", second, memory)
+    assert out_tokens == baseline("nahum")
+    assert memory.applied == memory.hits > 0
+    # Verse numbers are never remembered, and are still asked about
+    assert len(second.shown()) == len(first.shown()) - memory.applied > 0
+    # Decisions applied unasked are not counted again
+    assert memory.decisions == decisions
+
+
+def test_enter_takes_suggestion():
+    memory = correct.CorrectionMemory(None, auto_count=0)
+    first, out_tokens = run("nahum", FakeScreen(["c"]), memory)
+    assert len(first) == 1
+    corrections, out_tokens = run("nahum", FakeScreen(["\n"]), memory)
+    assert corrections == first
@@ -0,0 +1,79 @@
+import importlib
+import os
+
+import pytest
+
+import corpus
+
+index = importlib.import_module("swete-index")
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOOKS = [os.path.join(HERE, name) for name in ("33-Jonah.txt", "34-Nahum.txt")]
+
+
+def encode_postings(positions):
+    "Delta-encode sorted positions as IndexBuilder.write does"
+
+    blob = bytearray()
+    last = 0
+    for position in positions:
+        index.encode_varint(position - last, blob)
+        last = position
+    return blob
+
+
+@pytest.mark.parametrize("value, encoded", [
+    (0, b"\x00"), (1, b"\x01"), (127, b"\x7f"), (128, b"\x80\x01"),
+    (300, b"\xac\x02"), (16384, b"\x80\x80\x01")])
+def test_encode_varint(value, encoded):
+    out = bytearray()
+    index.encode_varint(value, out)
+    assert bytes(out) == encoded
+
+
+def test_postings_round_trip():
+    positions = [0, 1, 127, 128, 129, 16511, 16512, 2 ** 32 + 5]
+    blob = encode_postings(positions)
+    assert index.decode_postings(blob, 0, len(blob)) == positions
+
+
+def test_decode_postings_of_one_term():
+    first = encode_postings([3, 200, 70000])
+    second = encode_postings([5, 6])
+    blob = first + second
+    assert index.decode_postings(blob, 0, len(first)) == [3, 200, 70000]
+    assert index.decode_postings(blob, len(first), len(blob)) == [5, 6]
+    assert index.decode_postings(blob, len(first), len(first)) == []
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    "Return (Index, keys of each position) of the test books"
+
+    builder = index.IndexBuilder()
+    for path in BOOKS:
+        builder.add_book(path)
+    path = str(tmp_path_factory.mktemp("index") / "lxx.idx")
+    builder.write(path)
+    keys = [builder.key(token) for path in BOOKS
+            for ref, token in corpus.read_tokens(path)]
+    return index.Index(path), [key for key in keys if key]
+
+
+@pytest.mark.parametrize("phrase", [
+    "κυρίου", "λόγος κυρίου", "καὶ ἐγένετο λόγος κυρίου",
+    "ἐγένετο λόγος κυρίου πρὸς Ἰωνᾶν", "οὐδαμοῦ"])
+def test_search_matches_scan(built, phrase):
+    idx, keys = built
+    wanted = idx.keys(phrase)
+    found = [num for num in range(len(keys) - len(wanted) + 1)
+             if keys[num:num + len(wanted)] == wanted]
+    assert idx.search(phrase) == found
+
+
+def test_locate(built):
+    idx, keys = built
+    assert idx.locate(0) == ("33-Jonah", 33001001)
+    start = idx.doc_starts[1]
+    assert idx.locate(start)[0] == "34-Nahum"
+    assert idx.locate(start - 1)[0] == "33-Jonah"
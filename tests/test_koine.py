@@ -0,0 +1,94 @@
+import importlib
+import io
+import os
+import xml.sax
+
+import pytest
+
+import corpus
+import koine
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def round_trip(text):
+    "Return text converted to betacode and back"
+
+    return koine.convert_to_unicode(koine.convert_to_betacode(text))
+
+
+def expected(text):
+    "Return what the round trip should give: NFC, with one apostrophe"
+
+    text = koine.unicode_normalize(text)
+    return text.replace("’", "'").replace("\u1FBD", "'")
+
+
+def check_tokens(tokens):
+    "Round trip each token that converts, and return how many did"
+
+    converted = 0
+    for token in set(tokens):
+        try:
+            result = round_trip(token)
+        except ValueError:
+            # Latin letters, digits and stray marks of OCR have no betacode
+            continue
+        assert result == expected(token), token
+        converted += 1
+    return converted
+
+
+def test_round_trip_table():
+    for beta, uni in koine._converter("beta").items():
+        if uni.strip():
+            assert round_trip(uni) == expected(uni), beta
+
+
+@pytest.mark.parametrize("text, beta", [
+    ("λόγος", "LO/GOS"),
+    ("λόγοσ", "LO/GOS1"),
+    ("Ἰςσέδεκ", "*)IS2SE/DEK"),
+    ("ἐγένετο·", "E)GE/NETO:"),
+    ("κύριος·", "KU/RIOS:"),
+])
+def test_sigma_and_raised_dot(text, beta):
+    assert koine.convert_to_betacode(text) == beta
+    assert koine.convert_to_unicode(beta) == text
+
+
+@pytest.mark.parametrize("name", [
+    "done/nahum-catss.txt", "done/habakuk-catss.txt", "done/zeph-catss.txt",
+    "done/haggai-catss.txt", "zechariah-catss.txt"])
+def test_catss_streams_are_unchanged(name):
+    # The CATSS compare streams are NFC, with final sigma, the apostrophe
+    # for elision and no raised dot, so converting their betacode gives
+    # them as they are
+    with open(os.path.join(HERE, name), encoding="utf-8") as stream:
+        tokens = [token for token in stream.read().split()
+                  if not token.isdigit() and not token.startswith("/")]
+    assert not any(":" in token or "·" in token for token in tokens)
+    for token in set(tokens):
+        assert round_trip(token) == token
+
+
+def test_round_trip_stream():
+    with open(os.path.join(HERE, "zechariah-swete.txt"),
+              encoding="utf-8") as stream:
+        tokens = stream.read().split()
+    assert check_tokens(tokens) > 1000
+
+
+def test_round_trip_volume():
+    pytest.importorskip("koinenlp")
+    swete = importlib.import_module("convert-swete")
+    path = os.path.join(HERE, swete.volume_path(3))
+    if not os.path.exists(path):
+        pytest.skip("volume 3 is not here")
+    out = io.StringIO()
+    handler = swete.SweteLXX(book=None, task="compare", volume=3, out=out)
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    with corpus.open_text(path) as vol:
+        parser.parse(vol)
+    assert check_tokens(out.getvalue().split()) > 20000
@@ -0,0 +1,91 @@
+import importlib
+import itertools
+
+import numpy as np
+import pytest
+
+minhash = importlib.import_module("swete-minhash")
+
+# Distinct unaccented word forms, which normalize to themselves
+WORDS = ["".join(letters) for letters
+         in itertools.product("βγδκλμνπρτ", "αεηιουω", "νσ")]
+
+
+def verse(ref, words):
+    "Return the (ref, token) pairs of a verse"
+
+    return [(ref, word) for word in words]
+
+
+@pytest.fixture(scope="module")
+def lxx():
+    "An index of two books with a parallel, and a version of one of them"
+
+    kingdoms = (verse(10001001, WORDS[0:20]) + verse(10001002, WORDS[20:40])
+                + verse(10001003, WORDS[40:60]) + verse(10001004, [","]))
+    # 1:1 of Chronicles rewords a few words of 1:1 of Kingdoms
+    parallel = WORDS[0:8] + WORDS[100:102] + WORDS[10:20]
+    chronicles = (verse(20001001, parallel) + verse(20001002, WORDS[60:80])
+                  + verse(20001003, [WORDS[90]]))
+    version = verse(10001001, WORDS[0:20]) + verse(10001002, [WORDS[90]])
+    return minhash.Index.build([("Kingdoms", kingdoms),
+                                ("Chronicles", chronicles),
+                                ("Version", version)])
+
+
+def test_find(lxx):
+    assert list(lxx.find(10001001)) == [0, 7]
+    assert list(lxx.find("10001001", "Version")) == [7]
+    assert list(lxx.find(10009009)) == []
+
+
+def test_identical_verses_are_candidates(lxx):
+    kingdoms, version = lxx.find(10001001)
+    assert version in lxx.candidates(kingdoms)
+    assert lxx.similarity(kingdoms, [version])[0] == 1.0
+
+
+def test_parallel_is_candidate_with_its_similarity(lxx):
+    kingdoms = lxx.find(10001001, "Kingdoms")[0]
+    chronicles = lxx.find(20001001, "Chronicles")[0]
+    assert chronicles in lxx.candidates(kingdoms)
+    # The two share 16 of 22 distinct pairs of words
+    assert lxx.similarity(kingdoms, [chronicles])[0] == pytest.approx(
+        16 / 22, abs=0.15)
+
+
+def test_unrelated_verses_are_not_candidates(lxx):
+    kingdoms = lxx.find(10001002, "Kingdoms")[0]
+    assert list(lxx.candidates(kingdoms)) == []
+
+
+def test_short_verses_are_hashed_whole(lxx):
+    chronicles = lxx.find(20001003, "Chronicles")[0]
+    version = lxx.find(10001002, "Version")[0]
+    assert list(lxx.candidates(chronicles)) == [version]
+
+
+def test_verse_without_words_has_no_candidates(lxx):
+    empty = lxx.find(10001004, "Kingdoms")[0]
+    assert lxx.empty[empty]
+    assert list(lxx.candidates(empty)) == []
+    assert not any(empty in lxx.candidates(num)
+                   for num in range(len(lxx.refs)))
+
+
+def test_pairs(lxx):
+    found = {(lxx.label(verse), lxx.label(other))
+             for score, verse, other in lxx.pairs(0.5)}
+    assert found == {("Kingdoms 10001001", "Chronicles 20001001"),
+                     ("Kingdoms 10001001", "Version 10001001"),
+                     ("Chronicles 20001001", "Version 10001001"),
+                     ("Chronicles 20001003", "Version 10001002")}
+
+
+def test_save_and_load(lxx, tmp_path):
+    path = str(tmp_path / "lxx.minhash.npz")
+    lxx.save(path)
+    loaded = minhash.Index.load(path)
+    assert loaded.names == lxx.names
+    assert np.array_equal(loaded.rows, lxx.rows)
+    assert np.array_equal(loaded.buckets, lxx.buckets)
@@ -0,0 +1,54 @@
+import http.client
+import http.server
+import importlib
+import json
+import threading
+import urllib.parse
+
+import pytest
+
+pytest.importorskip("koinenlp")
+server = importlib.import_module("swete-server")
+
+
+@pytest.fixture(scope="module")
+def client():
+    "Serve no texts on a free port, and return a client of the server"
+
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                            server.CorpusHandler)
+    httpd.texts = {}
+    httpd.verbose = False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    connection = http.client.HTTPConnection("127.0.0.1",
+                                            httpd.server_address[1])
+    yield connection
+    connection.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(client, path, **params):
+    "Return the status and JSON body of a request"
+
+    client.request("GET", path + "?" + urllib.parse.urlencode(params))
+    response = client.getresponse()
+    return response.status, json.loads(response.read().decode("UTF-8"))
+
+
+def test_betacode(client):
+    assert get(client, "/betacode", text="LO/GOS") == (200, "λόγος")
+
+
+@pytest.mark.parametrize("text", ["λόγος", "LO/GOS~", "*"])
+def test_bad_betacode(client, text):
+    status, body = get(client, "/betacode", text=text)
+    assert status == 400
+    assert "Cannot convert" in body["error"]
+
+
+def test_encode(client):
+    assert get(client, "/encode", text="λόγος") == (200, "LO/GOS")
+    status, body = get(client, "/encode", text="abc")
+    assert status == 400
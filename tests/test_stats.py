@@ -0,0 +1,42 @@
+import importlib
+
+import pytest
+
+stats = importlib.import_module("swete-stats")
+
+
+@pytest.fixture
+def lxx(tmp_path):
+    "A corpus of two short books, with punctuation between words"
+
+    path = tmp_path / "34-Nahum.txt"
+    path.write_text("34001001 λῆμμα\n34001001 Νινευή\n34001001 ·\n"
+                    "34001002 θεὸς\n34001002 ,\n34001002 θεὸς\n",
+                    encoding="utf-8")
+    other = tmp_path / "35-Habakuk.txt"
+    other.write_text("35001001 λῆμμα\n35001001 .\n", encoding="utf-8")
+    return stats.Corpus([str(path), str(other)])
+
+
+def test_punctuation_is_not_a_type(lxx):
+    assert "" not in list(lxx.vocab)
+    assert len(lxx.ids) == 5
+    groups, types, tokens = lxx.type_token_ratios()
+    assert list(types) == [3, 1]
+    assert list(tokens) == [4, 1]
+
+
+def test_cooccurrences_stay_within_books(lxx):
+    left, right, counts = lxx.cooccurrences(1)
+    pairs = {(lxx.vocab[a], lxx.vocab[b]): count
+             for a, b, count in zip(left, right, counts)}
+    assert pairs == {("λημμα", "νινευη"): 1, ("νινευη", "θεοσ"): 1,
+                     ("θεοσ", "θεοσ"): 1}
+
+
+@pytest.mark.parametrize("window", [0, -1])
+def test_window_must_be_positive(lxx, window):
+    with pytest.raises(ValueError):
+        lxx.cooccurrences(window)
+    with pytest.raises(ValueError):
+        lxx.collocates("θεοσ", window)
@@ -0,0 +1,70 @@
+import versify
+
+WORDS = ("ἐν τῷ ὀγδόῳ μηνὶ ἔτους δευτέρου ἐπὶ Δαρείου ἐγένετο λόγος κυρίου "
+         "πρὸς Ζαχαρίαν τὸν τοῦ Βαραχίου υἱὸν Ἀδδὼ τὸν προφήτην").split()
+
+
+def stream(*verses):
+    "Return [chapter, verse, token] for the tokens of each (chapter, verse)"
+
+    return [[chapter, verse, token]
+            for (chapter, verse), tokens in verses for token in tokens]
+
+
+def test_anchors_identical():
+    keys = list(range(20))
+    chain = versify.anchors(keys, keys)
+    assert chain == [(num, num) for num in range(18)]
+
+
+def test_anchors_skip_repeated_runs():
+    a = [1, 2, 3, 1, 2, 3, 4, 5, 6]
+    b = [1, 2, 3, 4, 5, 6]
+    # 1 2 3 is found twice in a, so only the runs from 2 3 4 on pin
+    assert versify.anchors(a, b) == [(4, 1), (5, 2), (6, 3)]
+
+
+def test_anchors_keep_longest_ordered_chain():
+    a = list(range(10)) + list(range(100, 104))
+    b = list(range(100, 104)) + list(range(10))
+    chain = versify.anchors(a, b)
+    assert chain == [(num, num + 4) for num in range(8)]
+
+
+def test_match_pairs_changed_tokens():
+    a = ["a", "b", "c", "x", "d", "e", "f"]
+    b = ["a", "b", "c", "y", "d", "e", "f"]
+    assert list(versify.match(a, b)) == [(num, num) for num in range(7)]
+
+
+def test_renumber_missed_verse_number():
+    # Swete lost the number of verse 2, CATSS has it
+    swete = stream(((1, 1), WORDS))
+    catss = stream(((1, 1), WORDS[:8]), ((1, 2), WORDS[8:]))
+    refs = versify.renumber(swete, catss)
+    assert refs == [(1, 1)] * 8 + [(1, 2)] * (len(WORDS) - 8)
+    assert list(versify.disagreements(swete, refs)) == [
+        (1, 1, 1, 2, len(WORDS) - 8, WORDS[8])]
+
+
+def test_renumber_punctuation_follows_word_before():
+    swete = stream(((1, 1), WORDS[:8] + [","]), ((1, 2), WORDS[8:]))
+    catss = stream(((1, 1), WORDS[:9]), ((1, 2), WORDS[9:]))
+    refs = versify.renumber(swete, catss)
+    # The comma has no key, and goes with Δαρείου, the word before it
+    assert refs[7:10] == [(1, 1), (1, 1), (1, 1)]
+    assert refs[10:] == [(1, 2)] * (len(WORDS) - 9)
+
+
+def test_read_and_write_stream(tmp_path):
+    path = tmp_path / "swete.txt"
+    path.write_text("ἐν\nτῷ\n002\nμηνὶ\n001\nἔτους\n", encoding="utf-8")
+    tokens = versify.read_stream(str(path))
+    assert tokens == [[1, 1, "ἐν"], [1, 1, "τῷ"], [1, 2, "μηνὶ"],
+                      [2, 1, "ἔτους"]]
+    out = tmp_path / "out.txt"
+    with open(out, "w", encoding="utf-8") as stream_out:
+        versify.write_stream(tokens, [(1, 1), (1, 1), (1, 2), (2, 1)],
+                             stream_out)
+    assert out.read_text(encoding="utf-8") == (
+        "001\nἐν\nτῷ\n002\nμηνὶ\n001\nἔτους\n")
@@ -0,0 +1,132 @@
+import importlib
+import os
+
+import pytest
+
+pytest.importorskip("koinenlp")
+writeback = importlib.import_module("swete-writeback")
+swete = importlib.import_module("convert-swete")
+
+TEXT = "<p>1 λόγος κυρίου, καὶ\nἐγένετο Ἰωνᾶν τὸν</p>\n"
+
+
+def positions(data, verse_words):
+    "Return the positions of words, as token_positions does"
+
+    found = {}
+    start = 0
+    for verse, words in verse_words:
+        for word in words:
+            start = data.index(word.encode("UTF-8"), start)
+            end = start + len(word.encode("UTF-8"))
+            found.setdefault((1, verse), []).append((start, end))
+            start = end
+    return found
+
+
+@pytest.fixture
+def volume():
+    "Return the data of a volume and the positions of its tokens"
+
+    data = TEXT.encode("UTF-8")
+    return data, positions(data, [(1, ["λόγος", "κυρίου", "καὶ"]),
+                                  (2, ["ἐγένετο", "Ἰωνᾶν", "τὸν"])])
+
+
+def patched(data, patches):
+    "Return the data with the patches applied"
+
+    for start, end, new_bytes, correction in reversed(patches):
+        data = data[:start] + new_bytes + data[end:]
+    return data.decode("UTF-8")
+
+
+def test_read_corrections(tmp_path):
+    path = tmp_path / "nahum.txt"
+    path.write_text("Nahum 1:4 correct ξηραίνων -> ξηραίνον\n"
+                    "Nahum 1:5 delete καὶ\n"
+                    "Nahum 1:1 versification\n"
+                    "Nahum 2:3 insert Ἰωνᾶν\n", encoding="utf-8")
+    assert writeback.read_corrections(str(path)) == [
+        (1, 4, "correct", "ξηραίνων", "ξηραίνον"),
+        (1, 5, "delete", "καὶ", ""),
+        (1, 1, "versification", "", None),
+        (2, 3, "insert", "Ἰωνᾶν", None)]
+
+
+def test_corrections_without_place_are_skipped(volume):
+    data, found = volume
+    corrections = [(1, 1, "versification", "", None),
+                   (1, 2, "correct", "οὐδαμοῦ", "οὐδαμῶς")]
+    patches, skipped = writeback.find_patches(data, found, corrections)
+    assert patches == []
+    assert [reason for correction, reason in skipped] == [
+        "has no place in the volume", "not found in the volume"]
+
+
+def test_correct(volume):
+    data, found = volume
+    patches, skipped = writeback.find_patches(
+        data, found, [(1, 2, "correct", "Ἰωνᾶν", "Ἰωνάν")])
+    assert not skipped
+    assert patched(data, patches) == TEXT.replace("Ἰωνᾶν", "Ἰωνάν")
+
+
+def test_delete_takes_the_space_after(volume):
+    data, found = volume
+    patches, skipped = writeback.find_patches(
+        data, found, [(1, 1, "delete", "λόγος", "")])
+    assert patched(data, patches) == TEXT.replace("λόγος ", "")
+
+
+def test_delete_before_punctuation(volume):
+    data, found = volume
+    patches, skipped = writeback.find_patches(
+        data, found, [(1, 1, "delete", "κυρίου", "")])
+    assert patched(data, patches).startswith("<p>1 λόγος, καὶ\n")
+
+
+def test_delete_at_line_end_joins_the_line_before(volume):
+    data, found = volume
+    patches, skipped = writeback.find_patches(
+        data, found, [(1, 1, "delete", "καὶ", "")])
+    assert patched(data, patches).startswith("<p>1 λόγος κυρίου,\n")
+
+
+@pytest.fixture
+def volume_file(tmp_path):
+    "Write a volume with a page map and notes next to it"
+
+    path = str(tmp_path / "old_testament_1930_vol3.xml")
+    with open(path, 'w', encoding='utf-8') as vol:
+        vol.write(TEXT)
+    notes = swete.notes_path(path)
+    sidecars = [swete.page_map_path(path), notes, notes + ".idx"]
+    for sidecar in sidecars:
+        open(sidecar, 'w').close()
+    return path, sidecars
+
+
+def test_same_length_is_patched_in_place(volume, volume_file):
+    data, found = volume
+    path, sidecars = volume_file
+    # ᾶ and ὰ take three bytes each
+    patches, skipped = writeback.find_patches(
+        data, found, [(1, 2, "correct", "Ἰωνᾶν", "Ἰωνὰν")])
+    assert writeback.apply_patches(path, patches) == "in place"
+    with open(path, encoding='utf-8') as vol:
+        assert vol.read() == TEXT.replace("Ἰωνᾶν", "Ἰωνὰν")
+    assert all(os.path.exists(sidecar) for sidecar in sidecars)
+
+
+def test_other_length_is_patched_by_copy(volume, volume_file):
+    data, found = volume
+    path, sidecars = volume_file
+    patches, skipped = writeback.find_patches(
+        data, found, [(1, 1, "delete", "κυρίου", ""),
+                      (1, 2, "correct", "τὸν", "τὴν")])
+    assert writeback.apply_patches(path, patches) == "by copy"
+    with open(path, encoding='utf-8') as vol:
+        assert vol.read() == "<p>1 λόγος, καὶ\nἐγένετο Ἰωνᾶν τὴν</p>\n"
+    assert not any(os.path.exists(sidecar) for sidecar in sidecars)
+    assert not os.path.exists(path + ".tmp")
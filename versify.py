@@ -1,8 +1,8 @@
 #! /usr/bin/env python3
 #
-# Fix verse breaks in OGLP septuagint-dev files
+# Fix the verse breaks of a Swete compare stream after CATSS
 #
-# Copyright 2015 Nathan D. Smith <nathan@smithfam.info>
+# Copyright 2015, 2017 Nathan D. Smith <nathan@smithfam.info>
 #
 # Permission is hereby granted, free of charge, to any person obtaining a copy
 # of this software and associated documentation files (the "Software"), to deal
@@ -21,16 +21,222 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
+#
+# convert-swete.py infers verses from verse numbers in the text and from lb
+# numbers, and chapters from verse numbers going down, so a missed or misread
+# number shifts the verses that follow. Here the words of the Swete and CATSS
+# streams are aligned, and each Swete token takes the verse of the CATSS
+# token it lines up with. Tokens with nothing to line up with stay in the
+# verse of the token before them.
+#
+# Diffing whole books at once takes time growing with the square of their
+# length, so the streams are first pinned together at runs of words found
+# once in each (as in patience diff), and only the gaps between these
+# anchors are diffed.
 
+import argparse
+import bisect
+import collections
+import difflib
 import re
+import sys
+
+import corpus
+import koine
+
+VERSE_PAT = re.compile(r'^\d{3}$')
+# Words in a run that pins the streams together
+ANCHOR = 3
+# Longest gap between anchors, in CATSS tokens, matched on every word
+FULL_MATCH = 1000
+
+
+def read_stream(path):
+    """Return [chapter, verse, token] for each token of a compare stream.
+
+    Verse numbers are on lines of their own. As in convert-swete.py, the
+    stream starts in verse 1 of chapter 1, and the chapter goes up when
+    the verse number goes down."""
+
+    tokens = []
+    chapter = 1
+    verse = 1
+    with corpus.open_text(path) as stream:
+        for line in stream:
+            token = koine.unicode_normalize(line.strip())
+            if not token:
+                continue
+            if VERSE_PAT.match(token):
+                if int(token) < verse:
+                    chapter += 1
+                verse = int(token)
+                continue
+            tokens.append([chapter, verse, token])
+    return tokens
+
+
+def unique_runs(keys, size=ANCHOR):
+    "Return {run: position} of the runs of size keys found once in keys"
+
+    counts = collections.Counter()
+    positions = {}
+    for num in range(len(keys) - size + 1):
+        run = tuple(keys[num:num + size])
+        counts[run] += 1
+        positions[run] = num
+    return {run: num for run, num in positions.items() if counts[run] == 1}
+
+
+def anchors(a, b, size=ANCHOR):
+    """Return (i, j) of the runs of size keys found once in each of a and b,
+    keeping the longest chain in the same order in both."""
+
+    found = unique_runs(b, size)
+    pairs = sorted((i, found[run]) for run, i in unique_runs(a, size).items()
+                   if run in found)
+    # Longest increasing subsequence of j, by patience sorting
+    tails = []
+    tail_pairs = []
+    previous = {}
+    for pair in pairs:
+        pile = bisect.bisect_left(tails, pair[1])
+        previous[pair] = tail_pairs[pile - 1] if pile else None
+        if pile == len(tails):
+            tails.append(pair[1])
+            tail_pairs.append(pair)
+        else:
+            tails[pile] = pair[1]
+            tail_pairs[pile] = pair
+    chain = []
+    pair = tail_pairs[-1] if tail_pairs else None
+    while pair is not None:
+        chain.append(pair)
+        pair = previous[pair]
+    return chain[::-1]
+
+
+def match_range(a, b, i1, i2, j1, j2):
+    """Yield (i, j) pairing each position of a[i1:i2] with one of b[j1:j2],
+    where there are any."""
+
+    if i1 == i2 or j1 == j2:
+        return
+    # SequenceMatcher's autojunk, in a gap of 200 or more CATSS tokens,
+    # stops words making up over 1% of it (such as καὶ) from starting a
+    # match; they are only taken in at the ends of matches found. Gaps
+    # between anchors are rarely over a couple of dozen words, so it is
+    # kept only for gaps over FULL_MATCH, where no anchors were found, to
+    # bound the time they take.
+    matcher = difflib.SequenceMatcher(None, a[i1:i2], b[j1:j2],
+                                      autojunk=j2 - j1 > FULL_MATCH)
+    for op, k1, k2, l1, l2 in matcher.get_opcodes():
+        if op == "equal":
+            for num in range(k2 - k1):
+                yield i1 + k1 + num, j1 + l1 + num
+        elif op == "replace":
+            # Spread the Swete tokens evenly over the CATSS ones
+            for num in range(k2 - k1):
+                yield i1 + k1 + num, j1 + l1 + num * (l2 - l1) // (k2 - k1)
+
+
+def match(a, b, size=ANCHOR):
+    "Yield (i, j) pairing positions of a with positions of b, in order"
+
+    i = j = 0
+    for anchor_i, anchor_j in anchors(a, b, size):
+        # Runs overlapping the one before are already paired
+        if anchor_i < i or anchor_j < j:
+            continue
+        yield from match_range(a, b, i, anchor_i, j, anchor_j)
+        for num in range(size):
+            yield anchor_i + num, anchor_j + num
+        i, j = anchor_i + size, anchor_j + size
+    yield from match_range(a, b, i, len(a), j, len(b))
+
+
+def renumber(swete, catss):
+    """Return the (chapter, verse) of each Swete token after CATSS.
+
+    Tokens are matched on koine.normalize keys; punctuation and other
+    tokens without a key take the verse of the token before them."""
+
+    swete_keys = [koine.normalize(token) for chapter, verse, token in swete]
+    catss_keys = [koine.normalize(token) for chapter, verse, token in catss]
+    swete_words = [num for num, key in enumerate(swete_keys) if key]
+    catss_words = [(chapter, verse) for (chapter, verse, token), key
+                   in zip(catss, catss_keys) if key]
+    refs = [None] * len(swete)
+    for i, j in match([swete_keys[num] for num in swete_words],
+                      [key for key in catss_keys if key]):
+        refs[swete_words[i]] = catss_words[j]
+    # Fill the gaps from the token before, or at the start the one after
+    last = next((ref for ref in refs if ref is not None), (1, 1))
+    for num, ref in enumerate(refs):
+        if ref is None:
+            refs[num] = last
+        else:
+            last = ref
+    return refs
+
+
+def disagreements(swete, refs):
+    """Yield (old chapter, old verse, new chapter, new verse, count, first
+    token) for each run of Swete tokens whose verse changes."""
+
+    run = None
+    for (chapter, verse, token), ref in zip(swete, refs):
+        key = (chapter, verse) + ref
+        if run and tuple(run[:4]) == key:
+            run[4] += 1
+            continue
+        if run and run[:2] != run[2:4]:
+            yield tuple(run)
+        run = list(key) + [1, token]
+    if run and run[:2] != run[2:4]:
+        yield tuple(run)
+
+
+def write_stream(swete, refs, out):
+    """Write the Swete tokens as a compare stream, with verse numbers where
+    the corrected verses change. Like a CATSS stream, it starts with the
+    number of its first verse."""
+
+    current = None
+    for (chapter, verse, token), ref in zip(swete, refs):
+        if ref != current:
+            out.write("%03d\n" % ref[1])
+            current = ref
+        out.write(token + "\n")
+
 
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(
+        description='Renumber the verses of a Swete compare stream after '
+        'CATSS, reporting where they disagree.')
+    argparser.add_argument('swete', metavar='<file>', type=str,
+                           help='Swete compare stream')
+    argparser.add_argument('catss', metavar='<file>', type=str,
+                           help='CATSS stream')
+    argparser.add_argument('--out', '-o', metavar='<file>',
+                           type=argparse.FileType('w'), default=sys.stdout,
+                           help='Renumbered stream (default: stdout)')
+    argparser.add_argument('--book-num', '-n', metavar='<num>', type=int,
+                           default=0, help='Book number for references')
 
-lbnum = re.compile(r'<lb n="(?P<verse>\d{1,3})"/>')
+    args = argparser.parse_args()
+    swete = read_stream(args.swete)
+    refs = renumber(swete, read_stream(args.catss))
+    write_stream(swete, refs, args.out)
 
-vol = open('source/old_testament_1901_vol1.xml', 'r')
-lines = vol.readlines()
-vol.close()
-for line in lines:
-    lb_tag = lbnum.search(line)
-    if lb_tag:
-        pass
+    runs = 0
+    moved = 0
+    for (chapter, verse, new_chapter, new_verse, count,
+         token) in disagreements(swete, refs):
+        print("%s -> %s\t%d tokens from %s" % (
+            corpus.format_ref(corpus.pack_ref(args.book_num, chapter, verse)),
+            corpus.format_ref(corpus.pack_ref(args.book_num, new_chapter,
+                                              new_verse)),
+            count, token), file=sys.stderr)
+        runs += 1
+        moved += count
+    print("%d tokens in %d runs renumbered" % (moved, runs), file=sys.stderr)